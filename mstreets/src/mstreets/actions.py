@@ -1,7 +1,12 @@
+from django.contrib import messages
 from django.http import HttpResponseRedirect
 from django.shortcuts import render
 
+from mstreets.api import get_campaign_export_pois
+from mstreets.cache import bump_version
+from mstreets.export import export_response
 from mstreets.forms import MultiplePoiForm
+from mstreets.serializers import PoiSerializer
 
 
 def apply_edit(modeladmin, request, queryset, fields):
@@ -12,6 +17,8 @@ def apply_edit(modeladmin, request, queryset, fields):
 
     if len(list(per_actualitzar.keys())) > 0:
         queryset.update(**per_actualitzar)
+        # update no envia post_save
+        bump_version(queryset.model._meta.model_name)
         modeladmin.message_user(request, "S'han actualitzat %s objectes" % queryset.count())
 
 
@@ -67,3 +74,33 @@ def edit_multiple_poi(modeladmin, request, queryset):
 
 
 edit_multiple_poi.short_description = 'Editar els POI seleccionats'
+
+
+def export_campaign(modeladmin, request, queryset, export_format):
+    """Stream the POIs of the selected campaign like /api/campaign/<id>/export."""
+    if queryset.count() != 1:
+        modeladmin.message_user(request, 'Cal seleccionar una sola campanya per exportar', level=messages.WARNING)
+        return None
+    campaign = queryset.get()
+    pois = get_campaign_export_pois(request, campaign.pk)
+    if pois is None:
+        modeladmin.message_user(request, 'No tens permís per veure aquesta campanya', level=messages.ERROR)
+        return None
+    return export_response(pois, PoiSerializer, export_format, f'campaign_{campaign.pk}')
+
+
+def export_campaign_geojson(modeladmin, request, queryset):
+    return export_campaign(modeladmin, request, queryset, 'geojson')
+
+
+def export_campaign_csv(modeladmin, request, queryset):
+    return export_campaign(modeladmin, request, queryset, 'csv')
+
+
+def export_campaign_fgb(modeladmin, request, queryset):
+    return export_campaign(modeladmin, request, queryset, 'fgb')
+
+
+export_campaign_geojson.short_description = 'Exportar els POI de la campanya (GeoJSON)'
+export_campaign_csv.short_description = 'Exportar els POI de la campanya (CSV)'
+export_campaign_fgb.short_description = 'Exportar els POI de la campanya (FlatGeobuf)'
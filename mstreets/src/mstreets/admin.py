@@ -13,7 +13,7 @@ from mstreets.models import (
     Animation, PC, Campaign, Campaign_Category, Config, Metadata,
     Poi, Poi_Locations, Poi_Resource, Zone, ZoneGroupPermission
 )
-from mstreets.actions import edit_multiple_poi
+from mstreets.actions import edit_multiple_poi, export_campaign_csv, export_campaign_fgb, export_campaign_geojson
 from mstreets.forms import CampaignForm, PCForm, ZoneForm
 from .tenants.core.context_info import get_tenant_context_info_apis
 
@@ -121,6 +121,7 @@ class CampaignAdmin(TabsMixin, LeafletGeoAdmin):
     search_fields = ['name']
     list_filter = [('zones__name', DropdownFilter)]
     filter_horizontal = ['zones']
+    actions = [export_campaign_geojson, export_campaign_csv, export_campaign_fgb]
     fieldsets = [
         (None, {
             'classes': ('tab-dades_generals',),
@@ -1,93 +1,264 @@
-import math
 from scipy.spatial import cKDTree
 import numpy as np
-
-from django.http import JsonResponse
-
-from django.contrib.gis.db.models.functions import Distance
-from django.contrib.gis.geos import LineString, Point
-from django.db.models import Case, Q, When
-from django.db import models
+import json
+import math
+from functools import lru_cache
+from pyproj import Geod
+
+from django.http import HttpResponse, JsonResponse
+
+from django.contrib.gis.db.models import GeometryField
+from django.contrib.gis.db.models.functions import Envelope, Transform
+from django.contrib.gis.geos import GEOSGeometry, LineString, MultiLineString, Point
+from django.contrib.gis.measure import D
+from django.db.models import Case, Exists, F, OuterRef, Value, When, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Floor, RowNumber
+from django.db import connection, models
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
 
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
+from rest_framework_gis.serializers import GeoFeatureModelSerializer
 
-from mstreets.models import PC, Animation, Campaign, Config, Poi, Zone, ZoneGroupPermission
+from mstreets.cache import (
+    get_cached_search, get_search_cache_key, get_search_cache_stats, is_shared_cache, set_cached_search
+)
+from mstreets.conditional import versioned_etag
+from mstreets.config import get_config_rows
+from mstreets.db_geojson import get_feature_collection, join_json_object
+from mstreets.export import export_response
+from mstreets.functions import Geography, KNNDistance, LineLocatePoint, X, Y, geography_value
+from mstreets.models import PC, Animation, Campaign, Poi, Poi_Hotspot, Poi_Locations, Zone
+from mstreets.pagination import IdCursorPagination, is_paginated
+from mstreets.permissions import get_permitted_zones
+from mstreets.poi_index import query_bbox
+from mstreets.renderers import EXPORT_RENDERER_CLASSES, POI_PC_RENDERER_CLASSES, is_binary_request
 from mstreets.serializers import (
-    AnimationSerializer, CampaignSerializer, ConfigSerializer,
-    PCSerializer, PoiSerializer, ZoneSerializer
+    AnimationSerializer, CampaignSerializer,
+    PCSerializer, Poi_HotspotSerializer, PoiSerializer, ZoneSerializer,
+    select_output_fields
 )
+from mstreets.simplify import SIMPLIFIED_GEOMS, get_simplified_field, get_zoom_tolerance
+from mstreets.streaming import streaming_json_response
+from mstreets.tiles import TILE_LAYERS, build_tile, get_cached_tile, get_tile_path, is_valid_tile, save_cached_tile
 
+from .settings import (
+    DB_GEOJSON_ENDPOINTS, NEAREST_CANDIDATES_FACTOR, NEAREST_MAX_K, POI_INDEX_ENABLED, SEARCH_BATCH_MAX_POINTS,
+    SEARCH_CACHE_ENABLED, TILES_MAX_AGE
+)
 from .tenants import get_tenant_context_info_apis, import_tenant_attribute
 RemoteServiceUnavailableError = import_tenant_attribute('RemoteServiceUnavailable', 'context_info')
 
+GEOD = Geod(ellps='WGS84')
+# Metres per grau de latitud, la mateixa aproximació que interpolate_points
+METRES_PER_DEGREE = 40000000.0 / 360.0
+
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@versioned_etag('config')
 def config_list(request):
-    queryset = Config.objects.all()
+    # Les files es serveixen des de la memòria del procés, amb el format de ConfigSerializer
+    rows = get_config_rows()
 
     variable_name = request.GET.get('n')
     if variable_name:
-        try:
-            queryset = queryset.get(variable=variable_name)
-        except Config.DoesNotExist:
+        row = next((row for row in rows if row['variable'] == variable_name), None)
+        if row is None:
             return Response(status=status.HTTP_404_NOT_FOUND)
-        serializer = ConfigSerializer(queryset)
-        return Response(serializer.data)
+        return Response(row)
 
-    serializer = ConfigSerializer(queryset, many=True)
-    return Response(serializer.data)
+    return Response(rows)
 
 
 def get_permitted_zones_ids(request):
-    groups = request.user.groups.all()
-    zone_groups = ZoneGroupPermission.objects.filter(group__in=groups)
-    return Zone.objects.filter(
-        Q(public=True) | Q(pk__in=list(zone_groups.values_list('zone', flat=True)))
-    ).exclude(active=False)
+    return get_permitted_zones(request).queryset()
 
 
 def get_permitted_zones_by_point(request, point, radius):
-    groups = request.user.groups.all()
-    zone_groups = ZoneGroupPermission.objects.filter(group__in=groups)
-    buffer_width = radius / 40000000. * 360. / math.cos(point.y / 360. * math.pi)
-    circle = point.buffer(buffer_width)
-    return Zone.objects.filter(
-            geom__intersects=circle
+    return get_permitted_zones(request).queryset().alias(
+            geog=Geography('geom')
         ).filter(
-            Q(public=True) | Q(pk__in=list(zone_groups.values_list('zone', flat=True)))
-        ).exclude(active=False)
+            geog__dwithin=(point, D(m=radius))
+        )
 
 
 def get_permitted_zones_by_geom(request, geom):
-    groups = request.user.groups.all()
-    zone_groups = ZoneGroupPermission.objects.filter(group__in=groups)
-    return Zone.objects.filter(
-            geom__intersects=geom
-        ).filter(
-            Q(public=True) | Q(pk__in=list(zone_groups.values_list('zone', flat=True)))
-        ).exclude(active=False)
+    return get_permitted_zones(request).queryset().filter(geom__intersects=geom)
+
+
+def use_db_geojson(request, endpoint, Serializer):
+    # Només els serializers GeoJSON: db_geojson no sap generar relacions com Campaign.zones
+    return (
+        endpoint in DB_GEOJSON_ENDPOINTS and issubclass(Serializer, GeoFeatureModelSerializer)
+        and not is_binary_request(request)
+    )
+
+
+def json_text_response(content):
+    return HttpResponse(content, content_type='application/json')
+
+
+@lru_cache(maxsize=None)
+def get_valid_srids():
+    """Return the SRIDs of spatial_ref_sys, loaded once per process."""
+    return frozenset(connection.ops.spatial_ref_sys().objects.values_list('srid', flat=True))
+
+
+def is_valid_srid(srid):
+    return srid in get_valid_srids()
+
+
+def get_epsg(request):
+    epsg = request.GET.get('epsg')
+    if not epsg:
+        return None
+
+    try:
+        epsg = int(epsg)
+    except ValueError:
+        msg = 'ERROR: there is an error in EPSG parameter. Must be integer numer, p.e. 25831'
+        return Response(data=msg, status=status.HTTP_400_BAD_REQUEST)
+
+    if not is_valid_srid(epsg):
+        msg = 'ERROR: unknown EPSG parameter'
+        return Response(data=msg, status=status.HTTP_400_BAD_REQUEST)
+    return epsg
 
 
-def transform_geom_epsg(queryset, request):
-    if request.GET.get('epsg'):
+def get_geom_source(request):
+    """Return the geometry to serialize according to the geom, simplify and zoom parameters.
+
+    It is a field name, an expression or None when no geometry is requested,
+    or an error Response.
+    """
+    geom = request.GET.get('geom')
+    if geom == 'none':
+        return None
+    if geom == 'bbox':
+        return Envelope('geom')
+    if geom:
+        msg = 'ERROR: invalid geom parameter, it must be bbox or none'
+        return Response(data=msg, status=status.HTTP_400_BAD_REQUEST)
+
+    tolerance = None
+    try:
+        if request.GET.get('simplify'):
+            tolerance = float(request.GET.get('simplify'))
+        elif request.GET.get('zoom'):
+            tolerance = get_zoom_tolerance(int(request.GET.get('zoom')))
+    except ValueError:
+        msg = 'ERROR: invalid simplify or zoom parameter'
+        return Response(data=msg, status=status.HTTP_400_BAD_REQUEST)
+    if tolerance:
+        return get_simplified_field(tolerance) or 'geom'
+    return 'geom'
+
+
+def transform_geom_epsg(queryset, epsg, source='geom'):
+    """Annotate the geometry to serialize as geom_output, from source and reprojected to epsg."""
+    fields = [field.name for field in queryset.model._meta.fields]
+    if 'geom' not in fields:
+        return queryset
+    # Les geometries simplificades només es llegeixen quan es demanen
+    simplified = [name for name in fields if name in SIMPLIFIED_GEOMS.values()]
+    if simplified:
+        queryset = queryset.defer(*simplified)
+    if source == 'geom' and not epsg:
+        return queryset
+
+    if source is None:
+        expression = RawSQL('NULL::geometry', [], output_field=GeometryField(srid=4326))
+    elif epsg:
+        expression = Transform(source, epsg)
+    else:
+        expression = F(source) if isinstance(source, str) else source
+    return queryset.defer('geom').annotate(geom_output=expression)
+
+
+def is_true(value):
+    return bool(value) and value.lower() in ('true', 't')
+
+
+def get_list_response(request, queryset, Serializer, context, endpoint):
+    """Serialize a list endpoint, paginated with limit/cursor or streamed with stream=true if requested."""
+    if is_true(request.GET.get('stream')) and not is_binary_request(request):
+        return streaming_json_response(queryset, Serializer, context)
+
+    if is_paginated(request):
+        paginator = IdCursorPagination()
+        page = paginator.paginate_queryset(queryset, request)
+        serializer = Serializer(page, many=True, context=context)
+        return paginator.get_paginated_response(serializer.data)
+
+    if use_db_geojson(request, endpoint, Serializer):
+        return json_text_response(get_feature_collection(queryset, Serializer, **context))
+
+    serializer = Serializer(queryset, many=True, context=context)
+    return Response(serializer.data)
+
+
+def get_serializer_context(queryset):
+    if 'geom_output' in queryset.query.annotations:
+        return {'geom_source': 'geom_output'}
+    return {}
+
+
+def get_output_context(request):
+    """Return the serializer context of the fields, resources and precision parameters, or an error Response."""
+    context = {}
+    fields = request.GET.get('fields')
+    if fields:
+        context['fields'] = [name.strip() for name in fields.split(',') if name.strip()]
+    if request.GET.get('resources') == 'none':
+        context['omit'] = ['resources']
+
+    precision = request.GET.get('precision')
+    if precision:
         try:
-            epsg = int(request.GET.get('epsg'))
-            [obj.geom.transform(epsg) for obj in queryset]
+            precision = int(precision)
         except ValueError:
-            return 'ERROR: there is an error in EPSG parameter. Must be integer numer, p.e. 25831'
+            precision = -1
+        if not 0 <= precision <= 15:
+            msg = 'ERROR: invalid precision parameter, it must be an integer between 0 and 15'
+            return Response(data=msg, status=status.HTTP_400_BAD_REQUEST)
+        context['precision'] = precision
+    return context
+
+
+def apply_output_context(queryset, Serializer, context):
+    """Don't prefetch the resources of the POIs when they are not in the output."""
+    meta = Serializer.Meta
+    if 'resources' in meta.fields and 'resources' not in select_output_fields(meta.fields, meta, context):
+        queryset = queryset.prefetch_related(None)
     return queryset
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@versioned_etag('campaign', 'metadata', 'campaign_category')
 def campaign_list(request):
     permitted_zones = get_permitted_zones_ids(request)
-    queryset = Campaign.objects.filter(zones__in=permitted_zones).distinct('id')
+    queryset = Campaign.objects.filter(
+        zones__in=permitted_zones
+    ).select_related(
+        'metadata', 'category'
+    ).prefetch_related(
+        'zones'
+    ).distinct('id')
+
+    epsg = get_epsg(request)
+    if isinstance(epsg, Response):
+        return epsg
+    geom_source = get_geom_source(request)
+    if isinstance(geom_source, Response):
+        return geom_source
+    queryset = transform_geom_epsg(queryset, epsg, geom_source)
+    context = get_serializer_context(queryset)
 
     id = request.GET.get('id')
     if id:
@@ -95,73 +266,114 @@ def campaign_list(request):
             queryset = queryset.get(pk=id)
         except Campaign.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
-        transform_geom_epsg(queryset, request)
-        serializer = CampaignSerializer(queryset)
+        serializer = CampaignSerializer(queryset, context=context)
         return Response(serializer.data)
 
     zone = request.GET.get('z')
     if zone:
         queryset = queryset.filter(zone=zone)
 
-    transform_geom_epsg(queryset, request)
-    serializer = CampaignSerializer(queryset, many=True)
-    return Response(serializer.data)
+    return get_list_response(request, queryset, CampaignSerializer, context, 'campaign')
+
+
+def get_campaign_export_pois(request, campaign_pk):
+    """Return the POIs of the campaign with the permission rules of search, or None if it is not permitted."""
+    permitted_zones = get_permitted_zones_ids(request)
+    if not Campaign.objects.filter(pk=campaign_pk, zones__in=permitted_zones).exists():
+        return None
+    pois = Poi.objects.filter(campaign_id=campaign_pk).prefetch_related('resources')
+    pois = annotate_poi_permission(filter_pois(pois, {}, permitted_zones), permitted_zones)
+    return pois.order_by('id')
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@renderer_classes(EXPORT_RENDERER_CLASSES)
+def campaign_export(request, campaign_pk):
+    """Stream every POI of a campaign as GeoJSON, CSV or FlatGeobuf, chosen with format= or Accept."""
+    pois = get_campaign_export_pois(request, campaign_pk)
+    if pois is None:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    return export_response(pois, PoiSerializer, request.accepted_renderer.format, f'campaign_{campaign_pk}')
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@versioned_etag()
 def zone_list(request):
     queryset = get_permitted_zones_ids(request)
 
+    epsg = get_epsg(request)
+    if isinstance(epsg, Response):
+        return epsg
+    geom_source = get_geom_source(request)
+    if isinstance(geom_source, Response):
+        return geom_source
+    queryset = transform_geom_epsg(queryset, epsg, geom_source)
+    context = get_serializer_context(queryset)
+
     id = request.GET.get('id')
     if id:
         try:
             queryset = queryset.get(pk=id)
         except Zone.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
-        transform_geom_epsg(queryset, request)
-        serializer = ZoneSerializer(queryset)
+        serializer = ZoneSerializer(queryset, context=context)
         return Response(serializer.data)
 
-    transform_geom_epsg(queryset, request)
-    serializer = ZoneSerializer(queryset, many=True)
-    return Response(serializer.data)
+    return get_list_response(request, queryset, ZoneSerializer, context, 'zone')
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@renderer_classes(POI_PC_RENDERER_CLASSES)
 def poi_list(request):
     permitted_zones = get_permitted_zones_ids(request)
-    queryset = Poi.objects.filter(geom__in=permitted_zones)
+    queryset = Poi.objects.filter(geom__in=permitted_zones).prefetch_related('resources')
     id = request.GET.get('id')
     if not id:
         msg = 'ERROR: missing id parameter'
         return Response(data=msg, status=status.HTTP_400_BAD_REQUEST)
 
+    epsg = get_epsg(request)
+    if isinstance(epsg, Response):
+        return epsg
+    output_context = get_output_context(request)
+    if isinstance(output_context, Response):
+        return output_context
+    queryset = apply_output_context(transform_geom_epsg(queryset, epsg), PoiSerializer, output_context)
+    context = {**get_serializer_context(queryset), **output_context}
+
     try:
         queryset = queryset.get(pk=id)
     except Poi.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
-    transform_geom_epsg(queryset, request)
-    serializer = PoiSerializer(queryset)
+    serializer = PoiSerializer(queryset, context=context)
     return Response(serializer.data)
 
 
 def get_response_params_id_z_c(Model, Serializer, request):
-    permitted_zones = get_permitted_zones_ids(request)
-    if Model == PC:
-        permitted_zones = permitted_zones.filter(pc_permission=True)
+    permitted_zones = get_permitted_zones(request).queryset('pc' if Model == PC else None)
     queryset = Model.objects.all()
     queryset = filter_by_campaigns(queryset, permitted_zones)
 
+    epsg = get_epsg(request)
+    if isinstance(epsg, Response):
+        return epsg
+    output_context = get_output_context(request)
+    if isinstance(output_context, Response):
+        return output_context
+    queryset = transform_geom_epsg(queryset, epsg)
+    context = {**get_serializer_context(queryset), **output_context}
+
     id = request.GET.get('id')
     if id:
         try:
             queryset = queryset.get(pk=id)
         except Model.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
-        serializer = Serializer(queryset)
+        serializer = Serializer(queryset, context=context)
         return Response(serializer.data)
 
     zone = request.GET.get('z')
@@ -178,26 +390,27 @@ def get_response_params_id_z_c(Model, Serializer, request):
 
     queryset = queryset.order_by('-campaign__default')
 
-    transform_geom_epsg(queryset, request)
-    serializer = Serializer(queryset, many=True)
-    return Response(serializer.data)
+    return get_list_response(request, queryset, Serializer, context, Model._meta.model_name)
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@renderer_classes(POI_PC_RENDERER_CLASSES)
+@versioned_etag('pc', 'campaign')
 def pc_list(request):
     return get_response_params_id_z_c(PC, PCSerializer, request)
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@versioned_etag('animation', 'campaign')
 def animation_list(request):
     return get_response_params_id_z_c(Animation, AnimationSerializer, request)
 
 
-def get_point_radius(request):
+def get_point(params):
     latlon = None
-    p = request.GET.get('p')
+    p = params.get('p')
     if p:
         try:
             latlon = p.split(',')
@@ -209,8 +422,16 @@ def get_point_radius(request):
     if not latlon:
         return Response(data=msg, status=status.HTTP_400_BAD_REQUEST)
 
+    return Point(latlon[1], latlon[0], srid=4326)
+
+
+def get_point_radius(params):
+    point = get_point(params)
+    if isinstance(point, Response):
+        return point
+
     radius = None
-    r = request.GET.get('r')
+    r = params.get('r')
     if r:
         try:
             radius = int(r)
@@ -221,26 +442,22 @@ def get_point_radius(request):
     if not radius:
         return Response(data=msg, status=status.HTTP_400_BAD_REQUEST)
 
-    point = Point(latlon[1], latlon[0], srid=4326)
     return point, radius
 
 
-def params_filter(queryset, request):
+def params_filter(queryset, params):
     filters = [
         {'param': 't', 'field': 'tag'},
         {'param': 'z', 'field': 'zone'},
         {'param': 'c', 'field': 'campaign'}
     ]
-    filters = {f['field']: request.GET.get(f['param']) for f in filters if request.GET.get(f['param'])}
+    filters = {f['field']: params.get(f['param']) for f in filters if params.get(f['param'])}
     queryset = queryset.filter(**filters)
     return queryset
 
 
-def filter_by_multiple_polygons(Model, queryset, polygons):
-    filtered_queryset = Model.objects.none()
-    for polygon in polygons:
-        filtered_queryset = filtered_queryset | queryset.filter(geom__intersects=polygon.geom)
-    return filtered_queryset
+def filter_by_zones_geom(queryset, zones):
+    return queryset.filter(Exists(zones.filter(geom__intersects=OuterRef('geom'))))
 
 
 def filter_by_campaigns(queryset, zones):
@@ -248,36 +465,50 @@ def filter_by_campaigns(queryset, zones):
     return queryset.filter(campaign__in=campaigns)
 
 
-def get_pois(request, permitted_zones, point, radius):
-    buffer_width = radius / 40000000. * 360. / math.cos(point.y / 360. * math.pi)
-    circle = point.buffer(buffer_width)
-    pois = Poi.objects.filter(
-        geom__intersects=circle
+def get_poi_permission(zones):
+    """EXISTS condition that is true when the campaign of the row has a zone with poi_permission."""
+    campaign_zones = Campaign.zones.through.objects.filter(
+        campaign=OuterRef('campaign'),
+        zone__in=zones.filter(poi_permission=True).values('id')
+    )
+    return Exists(campaign_zones)
+
+
+def annotate_poi_permission(queryset, zones):
+    return queryset.annotate(has_poi_permission=get_poi_permission(zones))
+
+
+def get_pois(params, permitted_zones, point, radius):
+    pois = Poi.objects.alias(
+        geog=Geography('geom')
+    ).filter(
+        geog__dwithin=(point, D(m=radius))
     ).annotate(
-        distance=Distance(point, 'geom')
+        distance=KNNDistance('geog', geography_value(point))
+    ).prefetch_related(
+        'resources'
     )
-    pois = filter_by_multiple_polygons(Poi, pois, permitted_zones)
-    pois = filter_by_campaigns(pois, permitted_zones)
-    pois = params_filter(pois, request)
-    if request.GET.get('fpp'):
-        fpp = request.GET.get('fpp').upper()
-        pois = pois.filter(format=fpp)
-
-    transform_geom_epsg(pois, request)
-    permitted_zones = permitted_zones.filter(poi_permission=True).values_list('id', flat=True)
-    for poi in pois:
-        if len([
-            zone for zone in poi.campaign.zones.all().values_list('id', flat=True)
-            if zone in permitted_zones
-        ]) == 0:
-            poi.id = -1
-            poi.filename = None
-            poi.folder = None
-
-    if request.GET.get('sc'):
+    pois = filter_pois(pois, params, permitted_zones)
+    pois = annotate_poi_permission(pois, permitted_zones)
+    return order_pois(pois, params)
+
+
+def filter_pois(queryset, params, permitted_zones):
+    queryset = filter_by_zones_geom(queryset, permitted_zones)
+    queryset = filter_by_campaigns(queryset, permitted_zones)
+    queryset = params_filter(queryset, params)
+    if params.get('fpp'):
+        fpp = params.get('fpp').upper()
+        queryset = queryset.filter(format=fpp)
+    return queryset
+
+
+def order_pois(pois, params):
+    """Order the POIs of the sc campaign first, then default campaigns, then by distance."""
+    if params.get('sc'):
         return pois.annotate(
             priority=Case(
-                When(campaign__pk=int(request.GET.get('sc')), then=0),
+                When(campaign__pk=int(params.get('sc')), then=0),
                 default=1,
                 output_field=models.IntegerField(),
             )
@@ -286,36 +517,64 @@ def get_pois(request, permitted_zones, point, radius):
         return pois.order_by('-campaign__default', 'distance', '-campaign__date_start')
 
 
-def get_pcs(request, permitted_zones, point, radius=50):
-    buffer_width = radius / 40000000. * 360. / math.cos(point.y / 360. * math.pi)
-    circle = point.buffer(buffer_width)
-    pcs = PC.objects.filter(
-        geom__intersects=circle
+def get_nearest_pois(params, permitted_zones, point, k):
+    """Return the k nearest permitted POIs with the priority ordering of get_pois.
+
+    The candidates are the k * NEAREST_CANDIDATES_FACTOR nearest POIs, found with
+    the ``<->`` operator on the geography index, so the query does not depend on
+    a search radius.
+    """
+    geog_point = geography_value(point)
+    candidates = filter_pois(
+        Poi.objects.alias(geog=Geography('geom')),
+        params,
+        permitted_zones,
+    ).order_by(
+        KNNDistance('geog', geog_point)
+    ).values('pk')[:k * NEAREST_CANDIDATES_FACTOR]
+
+    pois = Poi.objects.filter(
+        pk__in=candidates
+    ).alias(
+        geog=Geography('geom')
+    ).annotate(
+        distance=KNNDistance('geog', geog_point)
+    ).prefetch_related(
+        'resources'
+    )
+    pois = annotate_poi_permission(pois, permitted_zones)
+    return order_pois(pois, params)[:k]
+
+
+def get_pcs(params, permitted_zones, point, radius=50):
+    pcs = PC.objects.alias(
+        geog=Geography('geom')
+    ).filter(
+        geog__dwithin=(point, D(m=radius))
     )
     permitted_zones = permitted_zones.filter(pc_permission=True)
-    pcs = filter_by_multiple_polygons(PC, pcs, permitted_zones)
+    pcs = filter_by_zones_geom(pcs, permitted_zones)
     pcs = filter_by_campaigns(pcs, permitted_zones)
-    pcs = params_filter(pcs, request)
+    pcs = params_filter(pcs, params)
 
-    if request.GET.get('fpc'):
-        fpc = request.GET.get('fpc').upper()
+    if params.get('fpc'):
+        fpc = params.get('fpc').upper()
         pcs = pcs.filter(format=fpc)
 
-    if request.GET.get('l'):
-        is_local = request.GET.get('l')
+    if params.get('l'):
+        is_local = params.get('l')
         is_local = is_local.lower() == 'true' or is_local.lower() == 't'
         pcs = pcs.filter(is_local=is_local)
 
-    if request.GET.get('d'):
-        is_downloadable = request.GET.get('d')
+    if params.get('d'):
+        is_downloadable = params.get('d')
         is_downloadable = is_downloadable.lower() == 'true' or is_downloadable.lower() == 't'
         pcs = pcs.filter(is_downloadable=is_downloadable)
 
-    transform_geom_epsg(pcs, request)
-    if request.GET.get('sc'):
+    if params.get('sc'):
         return pcs.annotate(
                 priority=Case(
-                    When(campaign__pk=int(request.GET.get('sc')), then=0),
+                    When(campaign__pk=int(params.get('sc')), then=0),
                     default=1,
                     output_field=models.IntegerField(),
                 )
@@ -326,27 +585,271 @@ def get_pcs(request, permitted_zones, point, radius=50):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@renderer_classes(POI_PC_RENDERER_CLASSES)
 def search(request):
-    point_radius = get_point_radius(request)
+    point_radius = get_point_radius(request.GET)
     if isinstance(point_radius, Response):
         return point_radius
     point, radius = point_radius
 
+    epsg = get_epsg(request)
+    if isinstance(epsg, Response):
+        return epsg
+    output_context = get_output_context(request)
+    if isinstance(output_context, Response):
+        return output_context
+
+    filter_output = request.GET.get('f')
+    if request.accepted_renderer.format == 'fgb' and not filter_output:
+        msg = 'ERROR: missing f parameter, a FlatGeobuf response has only poi or pc'
+        return Response(data=msg, status=status.HTTP_400_BAD_REQUEST)
+
+    cache_key = None
+    if SEARCH_CACHE_ENABLED and is_shared_cache():
+        fingerprint = get_permitted_zones(request).fingerprint
+        cache_key = get_search_cache_key(request.GET, point, radius, fingerprint)
+        cached_response = get_cached_search(cache_key)
+        if cached_response is not None:
+            return search_response(request, cached_response)
+
     response = {}
 
+    db_geojson = use_db_geojson(request, 'search', PoiSerializer)
     permitted_zones = get_permitted_zones_by_point(request, point, radius)
-    filter_output = request.GET.get('f')
     if not filter_output or filter_output.lower() == 'poi':
-        pois = get_pois(request, permitted_zones, point, radius)
-        response['poi'] = PoiSerializer(pois, many=True).data
+        pois = transform_geom_epsg(get_pois(request.GET, permitted_zones, point, radius), epsg)
+        pois = apply_output_context(pois, PoiSerializer, output_context)
+        context = {**get_serializer_context(pois), **output_context}
+        if db_geojson:
+            response['poi'] = get_feature_collection(pois, PoiSerializer, **context)
+        else:
+            response['poi'] = PoiSerializer(pois, many=True, context=context).data
 
     if not filter_output or filter_output.lower() == 'pc':
-        pcs = get_pcs(request, permitted_zones, point, radius)
-        response['pc'] = PCSerializer(pcs, many=True).data
+        pcs = transform_geom_epsg(get_pcs(request.GET, permitted_zones, point, radius), epsg)
+        context = {**get_serializer_context(pcs), **output_context}
+        if db_geojson:
+            response['pc'] = get_feature_collection(pcs, PCSerializer, **context)
+        else:
+            response['pc'] = PCSerializer(pcs, many=True, context=context).data
+
+    if db_geojson:
+        response = join_json_object(response)
+
+    if cache_key:
+        set_cached_search(cache_key, response)
+    return search_response(request, response)
+
+
+def get_rank(queryset):
+    """Row number of each row following the ordering of the queryset."""
+    order_by = [
+        F(field[1:]).desc() if field.startswith('-') else F(field).asc()
+        for field in queryset.query.order_by
+    ]
+    return Window(expression=RowNumber(), order_by=order_by)
+
+
+def get_batch_rows(querysets, *fields):
+    """Return the (entry, rank, pk, *fields) rows of the querysets in a single UNION ALL query.
+
+    querysets maps the entry index to its queryset and rank is the position of
+    the row in the ordering of the queryset.
+    """
+    parts = [
+        queryset.annotate(
+            entry=Value(entry, output_field=models.IntegerField()),
+            rank=get_rank(queryset),
+        ).order_by().prefetch_related(None).values_list('entry', 'rank', 'pk', *fields)
+        for entry, queryset in querysets.items()
+    ]
+    if not parts:
+        return []
+    return list(parts[0].union(*parts[1:], all=True).order_by('entry', 'rank'))
+
+
+def get_batch_entries(data):
+    """Return the (key, params) of each entry of a batch search request, or an error Response."""
+    if not isinstance(data, list) or not data:
+        msg = 'ERROR: the body must be a list of {p, r, filters} entries'
+        return Response(data=msg, status=status.HTTP_400_BAD_REQUEST)
+    if len(data) > SEARCH_BATCH_MAX_POINTS:
+        msg = f'ERROR: too many entries, the maximum is {SEARCH_BATCH_MAX_POINTS}'
+        return Response(data=msg, status=status.HTTP_400_BAD_REQUEST)
 
+    entries = []
+    keys = set()
+    for index, entry in enumerate(data):
+        if not isinstance(entry, dict) or not isinstance(entry.get('filters', {}), dict):
+            msg = f'ERROR: invalid entry {index}'
+            return Response(data=msg, status=status.HTTP_400_BAD_REQUEST)
+        p = entry.get('p')
+        if isinstance(p, (list, tuple)):
+            p = ','.join(map(str, p))
+        params = {key: str(value) for key, value in entry.get('filters', {}).items() if value is not None}
+        params.update({'p': p, 'r': entry.get('r') and str(entry.get('r'))})
+        key = str(entry.get('id', index))
+        # Les claus de la resposta han de ser úniques, si no els resultats se sobreescriurien
+        if key in keys:
+            msg = f'ERROR: duplicate entry id {key} (entry {index})'
+            return Response(data=msg, status=status.HTTP_400_BAD_REQUEST)
+        keys.add(key)
+        entries.append((key, params))
+    return entries
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def search_batch(request):
+    entries = get_batch_entries(request.data)
+    if isinstance(entries, Response):
+        return entries
+
+    epsg = get_epsg(request)
+    if isinstance(epsg, Response):
+        return epsg
+
+    pois_querysets = {}
+    pcs_querysets = {}
+    for entry, (key, params) in enumerate(entries):
+        point_radius = get_point_radius(params)
+        if isinstance(point_radius, Response):
+            return Response(data=f'{point_radius.data} (entry {key})', status=status.HTTP_400_BAD_REQUEST)
+        point, radius = point_radius
+
+        permitted_zones = get_permitted_zones_by_point(request, point, radius)
+        filter_output = (params.get('f') or '').lower()
+        if filter_output in ('', 'poi'):
+            pois_querysets[entry] = get_pois(params, permitted_zones, point, radius)
+        if filter_output in ('', 'pc'):
+            pcs_querysets[entry] = get_pcs(params, permitted_zones, point, radius)
+
+    # Una sola consulta per tots els punts i una altra per llegir els objectes
+    pois_rows = get_batch_rows(pois_querysets, 'has_poi_permission')
+    pcs_rows = get_batch_rows(pcs_querysets)
+    pois = transform_geom_epsg(
+        Poi.objects.filter(pk__in={row[2] for row in pois_rows}).prefetch_related('resources'), epsg
+    )
+    pcs = transform_geom_epsg(PC.objects.filter(pk__in={row[2] for row in pcs_rows}), epsg)
+    pois_context = get_serializer_context(pois)
+    pcs_context = get_serializer_context(pcs)
+    pois = {poi.pk: poi for poi in pois}
+    pcs = {pc.pk: pc for pc in pcs}
+
+    entry_pois = [[] for _ in entries]
+    for entry, rank, pk, has_poi_permission in pois_rows:
+        entry_pois[entry].append((pois[pk], has_poi_permission))
+    entry_pcs = [[] for _ in entries]
+    for entry, rank, pk in pcs_rows:
+        entry_pcs[entry].append(pcs[pk])
+
+    response = {}
+    for entry, (key, params) in enumerate(entries):
+        response[key] = {}
+        if entry in pois_querysets:
+            # El permís depèn de les zones de cada entrada, i un POI pot ser a diverses entrades
+            for poi, has_poi_permission in entry_pois[entry]:
+                poi.has_poi_permission = has_poi_permission
+            entry_instances = [poi for poi, _ in entry_pois[entry]]
+            response[key]['poi'] = PoiSerializer(entry_instances, many=True, context=pois_context).data
+        if entry in pcs_querysets:
+            response[key]['pc'] = PCSerializer(entry_pcs[entry], many=True, context=pcs_context).data
     return Response(response)
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@renderer_classes(POI_PC_RENDERER_CLASSES)
+def poi_nearest(request):
+    point = get_point(request.GET)
+    if isinstance(point, Response):
+        return point
+
+    k = 1
+    if request.GET.get('k'):
+        try:
+            k = int(request.GET.get('k'))
+        except ValueError:
+            k = 0
+        if not 0 < k <= NEAREST_MAX_K:
+            msg = f'ERROR: invalid k parameter, it must be between 1 and {NEAREST_MAX_K}'
+            return Response(data=msg, status=status.HTTP_400_BAD_REQUEST)
+
+    epsg = get_epsg(request)
+    if isinstance(epsg, Response):
+        return epsg
+
+    permitted_zones = get_permitted_zones(request).queryset()
+    pois = transform_geom_epsg(get_nearest_pois(request.GET, permitted_zones, point, k), epsg)
+    context = get_serializer_context(pois)
+    if use_db_geojson(request, 'poi_nearest', PoiSerializer):
+        return json_text_response(get_feature_collection(pois, PoiSerializer, **context))
+    return Response(PoiSerializer(pois, many=True, context=context).data)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def poi_hotspots(request, poi_pk):
+    permitted_zones = get_permitted_zones(request).queryset()
+    pois = filter_pois(Poi.objects.all(), {}, permitted_zones)
+    get_object_or_404(annotate_poi_permission(pois, permitted_zones), pk=poi_pk, has_poi_permission=True)
+
+    hotspots = Poi_Hotspot.objects.filter(
+        poi_id=poi_pk,
+        target__in=pois.values('pk'),
+    ).order_by('distance')
+    serializer = Poi_HotspotSerializer(hotspots, many=True)
+    return Response(serializer.data)
+
+
+def get_tile_queryset(permitted_zones, layer):
+    if layer == 'zone':
+        return permitted_zones.queryset()
+
+    zones = permitted_zones.queryset({'poi': 'poi', 'pc': 'pc'}.get(layer))
+    if layer == 'campaign':
+        return Campaign.objects.filter(pk__in=Campaign.objects.filter(zones__in=zones).values('pk'), active=True)
+
+    Model = {'poi': Poi, 'pc': PC, 'poi_locations': Poi_Locations}[layer]
+    queryset = filter_by_campaigns(Model.objects.all(), zones)
+    if layer in ('poi', 'pc'):
+        queryset = filter_by_zones_geom(queryset, zones)
+    return queryset
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def tile(request, layer, z, x, y):
+    if layer not in TILE_LAYERS or not is_valid_tile(z, x, y):
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    permitted_zones = get_permitted_zones(request)
+    path = get_tile_path(layer, permitted_zones.fingerprint, z, x, y)
+    content = get_cached_tile(path)
+    if content is None:
+        content = build_tile(get_tile_queryset(permitted_zones, layer), layer, z, x, y)
+        save_cached_tile(path, content)
+
+    response = HttpResponse(content, content_type='application/vnd.mapbox-vector-tile')
+    patch_cache_control(response, private=True, max_age=TILES_MAX_AGE)
+    return response
+
+
+def search_response(request, data):
+    # Amb DB_GEOJSON_ENDPOINTS la resposta ja és text JSON generat per PostGIS
+    if isinstance(data, str):
+        if is_binary_request(request):
+            return Response(json.loads(data))
+        return json_text_response(data)
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def search_cache_stats(request):
+    return Response(get_search_cache_stats())
+
+
 def get_linestring_from_request(request):
     line_str = request.GET.get('line')
     coords = [
@@ -357,12 +860,12 @@ def get_linestring_from_request(request):
 
 
 def interpolate_points(coords, distance=1.0):
-    distance_utm = distance / 40000000.0 * 360.0
     """
-    Interpola punts cada 'distance' metres sobre una línia definida per coords (llista de (lng, lat) en UTM!).
-    Retorna una llista de tuples (lng, lat).
+    Interpola punts cada 'distance' metres sobre una línia definida per coords (llista de (lng, lat)).
+    Retorna un array (n, 2) de (lng, lat).
     """
-    coords = np.array(coords)
+    distance_utm = distance / 40000000.0 * 360.0
+    coords = np.asarray(coords, dtype=float)
     # Calcular distàncies acumulades
     deltas = np.diff(coords, axis=0)
     seg_lengths = np.linalg.norm(deltas, axis=1)
@@ -370,72 +873,245 @@ def interpolate_points(coords, distance=1.0):
     total_length = cumdist[-1]
     num_points = int(np.floor(total_length / distance_utm))
     distances = np.linspace(0, total_length, num_points + 1)
-    points = []
-    seg_idx = 0
-    for d in distances:
-        while seg_idx < len(cumdist) - 2 and d > cumdist[seg_idx + 1]:
-            seg_idx += 1
-        seg_start = coords[seg_idx]
-        seg_end = coords[seg_idx + 1]
-        seg_dist = cumdist[seg_idx + 1] - cumdist[seg_idx]
-        if seg_dist == 0:
-            point = seg_start
-        else:
-            frac = (d - cumdist[seg_idx]) / seg_dist
-            point = seg_start + frac * (seg_end - seg_start)
-        points.append(tuple(point))
 
-    return [Point(pt[0], pt[1], srid=4326) for pt in points]
+    # Segment de cada distància: el primer que acaba a una distància >= d
+    seg_idx = np.clip(np.searchsorted(cumdist, distances, side='left') - 1, 0, len(cumdist) - 2)
+    seg_start = coords[seg_idx]
+    seg_dist = seg_lengths[seg_idx]
+    frac = np.divide(
+        distances - cumdist[seg_idx], seg_dist, out=np.zeros_like(distances), where=seg_dist > 0
+    )
+    return seg_start + frac[:, None] * deltas[seg_idx]
 
 
-def get_pois_lat_lng_along_line(linestring, permitted_zones):
-    distance = 30  # metres
-    buffer_width = distance / 40000000.0 * 360.0
-    buffer = linestring.buffer(buffer_width)
-    permitted_zones_ids = permitted_zones.filter(poi_permission=True).values_list('id', flat=True)
+def to_metres(coords, lat):
+    """Scale (lng, lat) coordinates to metres around the latitude lat, to compare distances between near points."""
+    scale = np.array([math.cos(math.radians(lat)), 1.0]) * METRES_PER_DEGREE
+    return np.asarray(coords, dtype=float) * scale
+
 
-    pois_qs = Poi.objects.filter(
-        geom__within=buffer,
-        campaign__zones__in=permitted_zones_ids,
+def get_route_corridor_rows(geom, permitted_zones, distance):
+    """Return the (id, lng, lat, filename, folder, campaign_id) of the permitted POIs near geom."""
+    return list(Poi.objects.alias(
+        geog=Geography('geom')
+    ).filter(
+        get_poi_permission(permitted_zones),
+        geog__dwithin=(geom, D(m=distance)),
         campaign__active=True
-    ).distinct()
+    ).values_list('id', X('geom'), Y('geom'), 'filename', 'folder', 'campaign_id'))
+
+
+def format_route_pois(pois_rows, idxs):
+    """Format the rows of get_route_corridor_rows at idxs, skipping consecutive repeats."""
+    pois_lat_lng = []
+    last_poi_id = None
+    for i in idxs:
+        poi_id, lng, lat, filename, folder, campaign_id = pois_rows[i]
+        if poi_id != last_poi_id:
+            poi_format = {
+                'id': poi_id,
+                'latLng': {
+                    'lat': lat,
+                    'lng': lng
+                },
+                'filename': filename,
+                'folder': folder
+            }
+            pois_lat_lng.append(poi_format)
+            last_poi_id = poi_id
+
+    return pois_lat_lng
+
+
+def get_pois_lat_lng_along_line(linestring, permitted_zones):
+    distance = 30  # metres
+    # Només es llegeixen les columnes necessàries
+    pois_rows = get_route_corridor_rows(linestring, permitted_zones, distance)
 
     line_points = interpolate_points(linestring, distance=3.0)
-    pois_list = list(pois_qs)
 
     # Prepara les coordenades dels POIs per al KDTree
-    if not pois_list or not line_points:
+    if not pois_rows or not len(line_points):
         return []
 
-    pois_coords = np.array([[poi.geom.x, poi.geom.y] for poi in pois_list])
+    pois_coords = np.array([row[1:3] for row in pois_rows])
     pois_tree = cKDTree(pois_coords)
 
-    # Coordenades dels punts interpolats
-    line_points_coords = np.array([[pt.x, pt.y] for pt in line_points])
+    # Cerca el POI més proper per a cada punt interpolat
+    dists, idxs = pois_tree.query(line_points, k=1)
+
+    return format_route_pois(pois_rows, idxs)
+
+
+def get_pois_lat_lng_along_lines(multilinestring, permitted_zones, preferred_campaign=None):
+    """Return the POIs along each line of multilinestring, like get_pois_lat_lng_along_line.
+
+    The corridor POIs of all the lines are fetched with one query. When
+    preferred_campaign is given, a POI of that campaign within the corridor
+    distance of a sample point is used instead of the nearest one.
+    """
+    distance = 30  # metres
+    pois_rows = get_route_corridor_rows(multilinestring, permitted_zones, distance)
+    if not pois_rows:
+        return [[] for _ in multilinestring]
+
+    pois_coords = np.array([row[1:3] for row in pois_rows])
+    preferred = np.array([row[5] == preferred_campaign for row in pois_rows])
+
+    lines_pois = []
+    for linestring in multilinestring:
+        line_points = interpolate_points(linestring, distance=3.0)
+        # Distàncies en metres, com l'ST_DWithin de get_route_corridor_rows
+        lat = linestring.centroid.y
+        line_metres = to_metres(line_points, lat)
+        pois_metres = to_metres(pois_coords, lat)
+        # POIs del corredor d'aquesta línia
+        line_dists, _ = cKDTree(line_metres).query(pois_metres, k=1, distance_upper_bound=distance)
+        candidates = np.flatnonzero(np.isfinite(line_dists))
+        if not len(candidates):
+            lines_pois.append([])
+            continue
+
+        # Cerca el POI més proper per a cada punt interpolat
+        dists, idxs = cKDTree(pois_coords[candidates]).query(line_points, k=1)
+        idxs = candidates[idxs]
+
+        preferred_candidates = candidates[preferred[candidates]]
+        if len(preferred_candidates):
+            preferred_dists, preferred_idxs = cKDTree(pois_metres[preferred_candidates]).query(
+                line_metres, k=1, distance_upper_bound=distance
+            )
+            found = np.isfinite(preferred_dists)
+            idxs[found] = preferred_candidates[preferred_idxs[found]]
+
+        lines_pois.append(format_route_pois(pois_rows, idxs))
+    return lines_pois
+
+
+def get_pois_lat_lng_along_line_from_index(linestring, permitted_zones):
+    """Same as get_pois_lat_lng_along_line, reading the POI coordinates from mstreets.poi_index.
+
+    Only the permitted campaigns are resolved in SQL. The corridor is the set of
+    POIs within 'distance' metres of the interpolated points of the line.
+    """
+    distance = 30  # metres
+    campaign_ids = Campaign.objects.filter(
+        zones__in=permitted_zones.filter(poi_permission=True),
+        active=True
+    ).values_list('id', flat=True).distinct()
+
+    min_x, min_y, max_x, max_y = linestring.extent
+    # Un grau de longitud és més curt que un de latitud: marge a la latitud més allunyada de l'equador
+    buffer_lat = distance / METRES_PER_DEGREE
+    buffer_lng = buffer_lat / math.cos(math.radians(max(abs(min_y), abs(max_y))))
+    bbox = (min_x - buffer_lng, min_y - buffer_lat, max_x + buffer_lng, max_y + buffer_lat)
+    ids, coords = query_bbox(campaign_ids, bbox)
+    line_points = interpolate_points(linestring, distance=3.0)
+    if not len(ids) or not len(line_points):
+        return []
+
+    # POIs del corredor: a menys de 'distance' metres d'algun punt interpolat, com l'ST_DWithin de kdtree
+    lat = (min_y + max_y) / 2
+    line_dists, _ = cKDTree(to_metres(line_points, lat)).query(
+        to_metres(coords, lat), k=1, distance_upper_bound=distance
+    )
+    in_corridor = np.isfinite(line_dists)
+    ids, coords = ids[in_corridor], coords[in_corridor]
+    if not len(ids):
+        return []
+
+    # Cerca el POI més proper per a cada punt interpolat
+    dists, idxs = cKDTree(coords).query(line_points, k=1)
+    idxs = idxs[np.concatenate([[True], idxs[1:] != idxs[:-1]])]
+
+    files = {
+        poi_id: (filename, folder)
+        for poi_id, filename, folder in Poi.objects.filter(pk__in=ids[idxs].tolist()).values_list(
+            'id', 'filename', 'folder'
+        )
+    }
+    pois_lat_lng = []
+    for i in idxs.tolist():
+        poi_id = int(ids[i])
+        # POI eliminat que l'índex encara no ha tret
+        if poi_id not in files:
+            continue
+        filename, folder = files[poi_id]
+        pois_lat_lng.append({
+            'id': poi_id,
+            'latLng': {
+                'lat': float(coords[i, 1]),
+                'lng': float(coords[i, 0])
+            },
+            'filename': filename,
+            'folder': folder
+        })
+    return pois_lat_lng
+
+
+def get_pois_lat_lng_along_line_postgis(linestring, permitted_zones):
+    """Snap the corridor POIs to the line in PostGIS.
 
-    # Cerca el POI més proper per a cada punt
-    dists, idxs = pois_tree.query(line_points_coords, k=1)
+    The line is divided in buckets of about 'step' metres and each POI goes to
+    the bucket of its ST_LineLocatePoint. The closest POI of each bucket is
+    kept with DISTINCT ON and the result is ordered along the line, with the
+    fraction of the line length as 'fraction'. The work depends on the number
+    of POIs of the corridor instead of the length of the line.
+    """
+    distance = 30  # metres
+    step = 3.0  # metres
+    lngs, lats = zip(*linestring.coords)
+    line_length = GEOD.line_length(lngs, lats)
+    buckets = max(1, math.ceil(line_length / step))
+
+    pois_rows = Poi.objects.alias(
+        geog=Geography('geom')
+    ).filter(
+        get_poi_permission(permitted_zones),
+        geog__dwithin=(linestring, D(m=distance)),
+        campaign__active=True
+    ).annotate(
+        fraction=LineLocatePoint(linestring, 'geom'),
+        bucket=Floor(F('fraction') * buckets),
+        distance=KNNDistance('geog', geography_value(linestring)),
+    ).order_by(
+        'bucket', 'distance'
+    ).distinct(
+        'bucket'
+    ).values_list('id', X('geom'), Y('geom'), 'filename', 'folder', 'fraction', 'bucket')
 
     pois_lat_lng = []
     last_poi_id = None
-    for i in idxs:
-        poi = pois_list[i]
-        if poi.pk != last_poi_id:
-            poi_format = {
-                'id': poi.pk,
+    for poi_id, lng, lat, filename, folder, fraction, bucket in sorted(pois_rows, key=lambda row: row[5]):
+        if poi_id != last_poi_id:
+            pois_lat_lng.append({
+                'id': poi_id,
                 'latLng': {
-                    'lat': poi.geom.y,
-                    'lng': poi.geom.x
+                    'lat': lat,
+                    'lng': lng
                 },
-                'filename': poi.filename,
-                'folder': poi.folder
-            }
-            pois_lat_lng.append(poi_format)
-            last_poi_id = poi.pk
-
+                'filename': filename,
+                'folder': folder,
+                'fraction': fraction
+            })
+            last_poi_id = poi_id
     return pois_lat_lng
 
 
+# Motors de /api/points_route (paràmetre engine)
+POINTS_ROUTE_ENGINES = {
+    'kdtree': get_pois_lat_lng_along_line,
+    'index': get_pois_lat_lng_along_line_from_index,
+    'postgis': get_pois_lat_lng_along_line_postgis,
+}
+
+
+def get_points_route_engine(name=None):
+    if not name:
+        name = 'index' if POI_INDEX_ENABLED else 'kdtree'
+    return POINTS_ROUTE_ENGINES.get(name)
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def points_route(request):
@@ -448,11 +1124,46 @@ def points_route(request):
             {'error': 'Error en el format de la línia. Ha de ser una cadena de coordenades separades per |, p.e. "lat,lng|lat,lng|..."'},
             status=400
         )
+    engine = get_points_route_engine(request.GET.get('engine'))
+    if not engine:
+        return JsonResponse(
+            {'error': "Motor desconegut, ha de ser un de: %s" % ', '.join(POINTS_ROUTE_ENGINES)},
+            status=400
+        )
     permitted_zones =  get_permitted_zones_by_geom(request, linestring)
-    pois_lat_lng = get_pois_lat_lng_along_line(linestring, permitted_zones)
+    pois_lat_lng = engine(linestring, permitted_zones)
     return JsonResponse({'poisLatLng': pois_lat_lng})
 
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def points_route_batch(request):
+    if not isinstance(request.data, dict) or not request.data.get('lines'):
+        return JsonResponse({'error': "Falta el paràmetre 'lines'"}, status=400)
+    try:
+        lines = GEOSGeometry(json.dumps(request.data['lines']), srid=4326)
+        if isinstance(lines, LineString):
+            lines = MultiLineString(lines, srid=4326)
+        if not isinstance(lines, MultiLineString):
+            raise ValueError(lines.geom_type)
+    except Exception:
+        return JsonResponse(
+            {'error': "Error en el format de 'lines'. Ha de ser una geometria GeoJSON MultiLineString"},
+            status=400
+        )
+
+    preferred_campaign = None
+    if request.data.get('sc'):
+        try:
+            preferred_campaign = int(request.data['sc'])
+        except (TypeError, ValueError):
+            return JsonResponse({'error': "Error en el format de 'sc'"}, status=400)
+
+    permitted_zones = get_permitted_zones_by_geom(request, lines)
+    lines_pois = get_pois_lat_lng_along_lines(lines, permitted_zones, preferred_campaign)
+    return JsonResponse({'poisLatLng': lines_pois})
+
+
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def context_info_api(request, campaign_pk):
@@ -6,6 +6,9 @@ class MstreetsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mstreets'
 
+    def ready(self):
+        from mstreets import signals  # noqa: F401
+
 
 def get_package_name():
     return f'{settings.GISCUBE_PLUGINS_PATH}.mstreets.src.mstreets'
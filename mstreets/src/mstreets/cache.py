@@ -0,0 +1,132 @@
+import hashlib
+import math
+import threading
+import time
+from typing import Dict, Iterable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .settings import (
+    MSTREETS_CACHE_ALIAS, SEARCH_CACHE_CELL_SIZE, SEARCH_CACHE_RADIUS_STEP, SEARCH_CACHE_TIMEOUT
+)
+
+
+# Paràmetres de api.search que modifiquen la resposta
+SEARCH_PARAMS = ('f', 't', 'c', 'z', 'fpp', 'fpc', 'l', 'd', 'sc', 'epsg', 'fields', 'resources', 'precision')
+# Models dels que depèn la resposta de api.search
+SEARCH_MODELS = ('poi', 'poi_resource', 'pc', 'campaign', 'zone', 'zonegrouppermission')
+
+# Backends de cache que no es comparteixen entre processos
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+SEARCH_HITS_KEY = 'mstreets:search:hits'
+SEARCH_MISSES_KEY = 'mstreets:search:misses'
+
+
+def get_cache():
+    return caches[MSTREETS_CACHE_ALIAS]
+
+
+def is_shared_cache() -> bool:
+    """Whether the mstreets cache is shared by all the workers, so a version bump reaches every one of them."""
+    return settings.CACHES[MSTREETS_CACHE_ALIAS]['BACKEND'] not in LOCAL_CACHE_BACKENDS
+
+
+def _version_key(name: str) -> str:
+    return f'mstreets:version:{name}'
+
+
+def get_versions(names: Iterable[str]) -> Dict[str, float]:
+    """Return the version stamp (last change timestamp) of each name.
+
+    Versions are bumped by mstreets.signals when the related models change, so
+    cache keys built with them are invalidated without deleting any entry.
+    """
+    cache = get_cache()
+    keys = {_version_key(name): name for name in names}
+    versions = cache.get_many(keys.keys())
+    missing = {key: time.time() for key in keys if key not in versions}
+    for key, version in missing.items():
+        cache.add(key, version, None)
+    versions.update(missing)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def bump_version(*names: str) -> None:
+    now = time.time()
+    get_cache().set_many({_version_key(name): now for name in names}, None)
+
+
+# Models modificats a la transacció en curs, per fil
+_pending = threading.local()
+
+
+def _bump_pending_versions() -> None:
+    names = getattr(_pending, 'names', None)
+    if names:
+        _pending.names = set()
+        bump_version(*names)
+
+
+def schedule_version_bump(name: str) -> None:
+    """Bump the version of name when the transaction is committed.
+
+    The models changed in a transaction are bumped together once, so a cascade
+    delete doesn't write the cache once per deleted row.
+    """
+    if not hasattr(_pending, 'names'):
+        _pending.names = set()
+    _pending.names.add(name)
+    transaction.on_commit(_bump_pending_versions)
+
+
+def get_permissions_fingerprint(zone_ids: Iterable[int]) -> str:
+    raw = ','.join(str(zone_id) for zone_id in sorted(zone_ids))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _incr(key: str) -> None:
+    cache = get_cache()
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def get_search_cache_key(params, point, radius: int, fingerprint: str) -> str:
+    cell = SEARCH_CACHE_CELL_SIZE / 111320.  # metres per grau de latitud
+    lat_cell = round(point.y / cell)
+    lng_cell = round(point.x * math.cos(math.radians(point.y)) / cell)
+    radius_bucket = math.ceil(radius / SEARCH_CACHE_RADIUS_STEP)
+    filters = [(param, params.get(param)) for param in SEARCH_PARAMS if params.get(param)]
+    versions = sorted(get_versions(SEARCH_MODELS).items())
+    raw = repr((lat_cell, lng_cell, radius_bucket, filters, fingerprint, versions))
+    return 'mstreets:search:' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def get_cached_search(key: str):
+    data = get_cache().get(key)
+    _incr(SEARCH_MISSES_KEY if data is None else SEARCH_HITS_KEY)
+    return data
+
+
+def set_cached_search(key: str, data) -> None:
+    get_cache().set(key, data, SEARCH_CACHE_TIMEOUT)
+
+
+def get_search_cache_stats() -> Dict[str, float]:
+    stats = get_cache().get_many([SEARCH_HITS_KEY, SEARCH_MISSES_KEY])
+    hits = stats.get(SEARCH_HITS_KEY, 0)
+    misses = stats.get(SEARCH_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else None,
+    }
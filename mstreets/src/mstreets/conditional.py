@@ -0,0 +1,50 @@
+import hashlib
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from mstreets.cache import get_versions
+from mstreets.permissions import PERMISSION_MODELS, get_permitted_zones, is_permissions_cache_enabled
+
+
+def get_versioned_etag(request, versions) -> str:
+    fingerprint = get_permitted_zones(request).fingerprint
+    raw = repr((sorted(versions.items()), fingerprint, request.get_full_path(), request.META.get('HTTP_ACCEPT')))
+    return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+
+def versioned_etag(*model_names):
+    """Answer conditional GET requests of a view from the version stamps of model_names.
+
+    The ETag combines the versions of the models (and of the territorial
+    permissions), the permission fingerprint of the user and the query string,
+    all of them read from the cache, so a matching If-None-Match is answered
+    with 304 without querying the tables of the view. No Last-Modified is
+    sent, the versions don't account for changes of the user permissions.
+
+    The versions are only seen by every worker with a shared cache, and the
+    permissions are only read from the cache with PERMISSIONS_CACHE_ENABLED.
+    Otherwise the view is served as is. It has to be applied below api_view,
+    so request.user is already authenticated.
+    """
+    model_names = tuple(model_names) + PERMISSION_MODELS
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            # Sense la cache de permisos, l'ETag ja consultaria les zones a cada petició
+            if not is_permissions_cache_enabled():
+                return view(request, *args, **kwargs)
+            etag = get_versioned_etag(request, get_versions(model_names))
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response['ETag'] = etag
+            # La resposta depèn de l'usuari i s'ha de revalidar sempre
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,65 @@
+import math
+import time
+from typing import Any, Dict, List
+
+from mstreets.cache import get_versions, is_shared_cache
+from mstreets.models import Config
+
+from .settings import CONFIG_CACHE_TIMEOUT
+
+
+# (versió, moment de càrrega, files tal com les retorna /api/config, valors amb tipus) carregats pel procés
+_config = (None, None, [], {})
+
+
+def parse_config_value(value: str) -> Any:
+    """Convert a Config value to bool, int or float when it looks like one."""
+    lower = value.strip().lower()
+    if lower in ('true', 'false'):
+        return lower == 'true'
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    return number if math.isfinite(number) else value
+
+
+def load_config():
+    """Return the Config rows and typed values, loaded once per process.
+
+    With a shared cache they are reloaded when the config version, bumped by
+    mstreets.signals, changes. A per-process cache only sees the changes made
+    by the same worker, so there they are reloaded every CONFIG_CACHE_TIMEOUT
+    seconds, which bounds how long the other workers serve an old Config.
+    """
+    global _config
+    now = time.monotonic()
+    if is_shared_cache():
+        version = get_versions(('config',))['config']
+        expired = _config[0] != version
+    else:
+        version = None
+        expired = _config[1] is None or now - _config[1] > CONFIG_CACHE_TIMEOUT
+    if expired:
+        rows = list(Config.objects.order_by('pk').values('variable', 'value'))
+        values = {}
+        for row in rows:
+            values.setdefault(row['variable'], parse_config_value(row['value']))
+        _config = (version, now, rows, values)
+    return _config
+
+
+def get_config_rows() -> List[Dict[str, str]]:
+    return load_config()[2]
+
+
+def get_config() -> Dict[str, Any]:
+    return load_config()[3]
+
+
+def get_config_value(variable: str, default=None) -> Any:
+    return get_config().get(variable, default)
@@ -0,0 +1,162 @@
+import json
+from typing import Dict
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import DateTimeField, F, Window
+from django.db.models.fields.reverse_related import ManyToOneRel
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from mstreets.functions import AsPlainGeoJSON
+from mstreets.serializers import select_output_fields
+
+
+GEOJSON_PRECISION = 15
+# Anotació de api.annotate_poi_permission que indica si es poden mostrar els camps del POI
+PERMISSION_ANNOTATION = 'has_poi_permission'
+# Anotació amb la posició de cada fila segons l'ordre del queryset
+ORDER_ANNOTATION = 'feature_order'
+
+
+def _literal(value) -> str:
+    return 'NULL' if value is None else str(int(value))
+
+
+def _string_literal(value: str) -> str:
+    return "'%s'" % value.replace("'", "''")
+
+
+def datetime_sql(sql: str) -> str:
+    """Format a datetime column like DRF: ISO 8601 in the current time zone, microseconds only when not 0."""
+    if settings.USE_TZ:
+        local = f'({sql} AT TIME ZONE {_string_literal(timezone.get_current_timezone_name())})'
+        offset = f"extract(epoch FROM {local} - ({sql} AT TIME ZONE 'UTC'))::int"
+        suffix = (
+            f" || CASE WHEN {offset} = 0 THEN 'Z' ELSE CASE WHEN {offset} < 0 THEN '-' ELSE '+' END || "
+            f"to_char(make_interval(secs => abs({offset})), 'HH24:MI') END"
+        )
+    else:
+        local, suffix = sql, ''
+    microseconds = f"mod(date_part('microseconds', {local})::int, 1000000)"
+    return (
+        f"(to_char({local}, 'YYYY-MM-DD\"T\"HH24:MI:SS') || "
+        f"CASE WHEN {microseconds} = 0 THEN '' ELSE to_char({local}, '.US') END{suffix})"
+    )
+
+
+def get_ordering(queryset):
+    """Return the ordering of the queryset as expressions, ending with the primary key."""
+    ordering = []
+    for item in queryset.query.order_by or queryset.model._meta.ordering:
+        if isinstance(item, str):
+            if item == '?':
+                continue
+            expression = F(item.lstrip('-'))
+            item = expression.desc() if item.startswith('-') else expression.asc()
+        ordering.append(item)
+    return ordering + [F('pk').asc()]
+
+
+class FeatureCollectionSQL():
+    """Build a GeoJSON FeatureCollection in PostGIS with the layout of a GeoFeatureModelSerializer.
+
+    The properties are taken from the serializer Meta.fields: concrete fields are
+    read from the queryset columns and reverse relations with a nested
+    serializer are aggregated with a json_agg subquery. The features keep the
+    order of the queryset. fields, omit and precision work like in
+    serializers.OutputOptionsMixin.
+    """
+
+    def __init__(self, queryset, serializer_class, geom_source=None, fields=None, omit=None, precision=None):
+        self.queryset = queryset
+        self.geom_source = geom_source
+        self.precision = GEOJSON_PRECISION if precision is None else precision
+        self.model = queryset.model
+        self.meta = serializer_class.Meta
+        self.fields = select_output_fields(self.meta.fields, self.meta, {'fields': fields, 'omit': omit})
+        self.declared_fields = serializer_class._declared_fields
+        self.connection = connections[queryset.db]
+        self.qn = self.connection.ops.quote_name
+        self.id_field = getattr(self.meta, 'id_field', self.model._meta.pk.name)
+        self.masked_fields = {}
+        if PERMISSION_ANNOTATION in queryset.query.annotations:
+            self.masked_fields = getattr(serializer_class, 'permission_masked_fields', {})
+        self.columns = {self.model._meta.pk.attname}
+
+    def nested_sql(self, name: str, rel: ManyToOneRel) -> str:
+        qn = self.qn
+        related_meta = rel.related_model._meta
+        child_fields = self.declared_fields[name].child.Meta.fields
+        pairs = ', '.join(
+            f"'{field}', r.{qn(related_meta.get_field(field).column)}" for field in child_fields
+        )
+        return (
+            f"(SELECT coalesce(json_agg(json_build_object({pairs}) ORDER BY r.{qn(related_meta.pk.column)}), "
+            f"'[]'::json) FROM {qn(related_meta.db_table)} r "
+            f"WHERE r.{qn(rel.field.column)} = t.{qn(self.model._meta.pk.column)})"
+        )
+
+    def value_sql(self, name: str) -> str:
+        field = self.model._meta.get_field(name)
+        if isinstance(field, ManyToOneRel):
+            return self.nested_sql(name, field)
+
+        self.columns.add(field.attname)
+        sql = f't.{self.qn(field.column)}'
+        if isinstance(field, DateTimeField):
+            sql = datetime_sql(sql)
+        if name in self.masked_fields:
+            sql = f'CASE WHEN t.{PERMISSION_ANNOTATION} THEN {sql} ELSE {_literal(self.masked_fields[name])} END'
+        return sql
+
+    def as_sql(self):
+        properties = ', '.join(
+            f"'{name}', {self.value_sql(name)}"
+            for name in self.fields if name not in (self.id_field, self.meta.geo_field)
+        )
+        feature = []
+        if self.id_field:
+            feature.append(f"'id', {self.value_sql(self.id_field)}")
+        feature.append("'type', 'Feature'")
+        feature.append("'geometry', t.geojson::json")
+        feature.append(f"'properties', json_build_object({properties})")
+
+        values = list(self.columns) + ['geojson', ORDER_ANNOTATION]
+        if self.masked_fields:
+            values.append(PERMISSION_ANNOTATION)
+        inner = self.queryset.prefetch_related(None).annotate(
+            geojson=AsPlainGeoJSON(self.geom_source or self.meta.geo_field, self.precision),
+            **{ORDER_ANNOTATION: Window(RowNumber(), order_by=get_ordering(self.queryset))}
+        ).values(*values)
+        inner_sql, params = inner.query.sql_with_params()
+        sql = (
+            "SELECT json_build_object('type', 'FeatureCollection', 'features', "
+            f"coalesce(json_agg(json_build_object({', '.join(feature)}) ORDER BY t.{ORDER_ANNOTATION}), "
+            "'[]'::json))::text "
+            f'FROM ({inner_sql}) t'
+        )
+        return sql, params
+
+
+def get_feature_collection(queryset, serializer_class, geom_source=None, **options) -> str:
+    """Return the serialized FeatureCollection of the queryset as JSON text.
+
+    geom_source is the name of an annotation to read the geometry from, like
+    the reprojected or simplified geometry of api.transform_geom_epsg. The
+    options are the fields, omit and precision of api.get_output_context.
+    """
+    try:
+        sql, params = FeatureCollectionSQL(queryset, serializer_class, geom_source, **options).as_sql()
+    except EmptyResultSet:
+        # Filtre que no pot retornar cap fila, com pk__in=[] quan l'usuari no té zones permeses
+        return json.dumps({'type': 'FeatureCollection', 'features': []})
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()[0]
+
+
+def join_json_object(parts: Dict[str, str]) -> str:
+    """Join already serialized JSON values into a JSON object."""
+    return '{%s}' % ', '.join(f'{json.dumps(key)}: {value}' for key, value in parts.items())
@@ -0,0 +1,119 @@
+import csv
+import json
+import os
+import tempfile
+
+import fiona
+from fiona.crs import CRS
+
+from django.core.exceptions import FieldDoesNotExist
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from mstreets.renderers import to_fiona_feature
+from mstreets.streaming import iter_chunks, iter_serialized_json
+
+from .settings import STREAM_CHUNK_SIZE
+
+
+EXPORT_CONTENT_TYPES = {
+    'geojson': 'application/geo+json',
+    'csv': 'text/csv',
+    'fgb': 'application/flatgeobuf',
+}
+
+# Tipus de camp de Django -> tipus de propietat a la capa FlatGeobuf (la resta s'escriuen com a text)
+FIONA_FIELD_TYPES = {
+    'AutoField': 'int',
+    'BigAutoField': 'int',
+    'IntegerField': 'int',
+    'BigIntegerField': 'int',
+    'SmallIntegerField': 'int',
+    'PositiveIntegerField': 'int',
+    'PositiveSmallIntegerField': 'int',
+    'ForeignKey': 'int',
+    'FloatField': 'float',
+    'DecimalField': 'float',
+    'BooleanField': 'bool',
+}
+
+FILE_BLOCK_SIZE = 64 * 1024
+
+
+class Echo:
+    """File-like object that returns the written value, to stream csv.writer rows."""
+
+    def write(self, value):
+        return value
+
+
+def iter_features(queryset, Serializer, context=None, chunk_size=STREAM_CHUNK_SIZE):
+    for chunk in iter_chunks(queryset, chunk_size):
+        yield from Serializer(chunk, many=True, context=context or {}).data['features']
+
+
+def iter_csv(queryset, Serializer, context=None, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield the CSV rows of the features, with the coordinates as lng and lat and nested values as JSON."""
+    meta = Serializer.Meta
+    names = [name for name in meta.fields if name not in ('id', meta.geo_field)]
+    writer = csv.writer(Echo())
+    yield writer.writerow(['id', 'lng', 'lat'] + names)
+    for feature in iter_features(queryset, Serializer, context, chunk_size):
+        coordinates = (feature['geometry'] or {}).get('coordinates') or (None, None)
+        row = [feature.get('id'), *coordinates[:2]]
+        for name in names:
+            value = feature['properties'].get(name)
+            row.append(json.dumps(value, cls=JSONEncoder) if isinstance(value, (dict, list)) else value)
+        yield writer.writerow(row)
+
+
+def get_serializer_schema(Serializer):
+    """Return the fiona schema of the features of a GeoFeatureModelSerializer, from the model fields."""
+    meta = Serializer.Meta
+    properties = {'id': 'int'}
+    for name in meta.fields:
+        if name in ('id', meta.geo_field):
+            continue
+        try:
+            field_type = meta.model._meta.get_field(name).get_internal_type()
+        except FieldDoesNotExist:
+            field_type = None
+        properties[name] = FIONA_FIELD_TYPES.get(field_type, 'str')
+    geom_class = meta.model._meta.get_field(meta.geo_field).geom_class.__name__
+    return {'geometry': 'Unknown' if geom_class == 'GEOSGeometry' else geom_class, 'properties': properties}
+
+
+def iter_flatgeobuf(queryset, Serializer, context=None, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield a FlatGeobuf file of the features, with its spatial index.
+
+    The index goes before the features in the file, so the features are
+    written by chunks to a temporary file first and then streamed by blocks.
+    """
+    schema = get_serializer_schema(Serializer)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'export.fgb')
+        with fiona.open(
+            path, 'w', driver='FlatGeobuf', schema=schema, crs=CRS.from_epsg(4326), SPATIAL_INDEX='YES'
+        ) as layer:
+            for chunk in iter_chunks(queryset, chunk_size):
+                features = Serializer(chunk, many=True, context=context or {}).data['features']
+                layer.writerecords(to_fiona_feature(feature, schema) for feature in features)
+        with open(path, 'rb') as f:
+            yield from iter(lambda: f.read(FILE_BLOCK_SIZE), b'')
+
+
+EXPORT_GENERATORS = {
+    'geojson': iter_serialized_json,
+    'csv': iter_csv,
+    'fgb': iter_flatgeobuf,
+}
+
+
+def export_response(queryset, Serializer, export_format, filename, context=None):
+    """Stream the queryset in export_format with a server side cursor, as an attachment."""
+    response = StreamingHttpResponse(
+        EXPORT_GENERATORS[export_format](queryset, Serializer, context),
+        content_type=EXPORT_CONTENT_TYPES[export_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
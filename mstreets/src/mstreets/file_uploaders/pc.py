@@ -6,6 +6,7 @@ from pyproj import Transformer
 
 from django.contrib.gis.geos import Polygon
 
+from mstreets.cache import bump_version
 from mstreets.file_uploaders.utils import float_or_none
 from mstreets.models import PC
 
@@ -121,6 +122,8 @@ class PCUploader(ABC):
         try:
             pc_objects = [PC(**pc) for pc in self.pcs]
             PC.objects.bulk_create(pc_objects, batch_size=1000)
+            # bulk_create no envia post_save
+            bump_version('pc')
             return True
         except Exception as e:
             return False
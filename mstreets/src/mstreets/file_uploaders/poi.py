@@ -11,6 +11,7 @@ from datetime import datetime
 from django.contrib.gis.geos import Point
 from django.utils.timezone import make_aware
 
+from mstreets.cache import bump_version
 from mstreets.models import Poi, Poi_Resource, Campaign
 from mstreets.file_uploaders.utils import float_or_none
 
@@ -80,6 +81,8 @@ class PoiUploader(ABC):
         self.geoms = []
         self.pois = []
         self.resources = []
+        # Ids dels POIs creats, per actualitzar l'índex de coordenades de la campanya
+        self.poi_ids = []
 
     def __has_missing_data(self, data: Dict[str, any]) -> bool:
         missing_fields = [
@@ -240,6 +243,9 @@ class PoiUploader(ABC):
 
             Poi.objects.bulk_create(poi_list, batch_size=1000)  # Up to 2000
             Poi_Resource.objects.bulk_create(poi_resources_list, batch_size=1000)  # Up to 4000
+            self.poi_ids = [poi.pk for poi in poi_list]
+            # bulk_create no envia post_save
+            bump_version('poi', 'poi_resource')
             return True
         except Exception as e:
             print(e)
@@ -4,6 +4,7 @@ from abc import ABC, abstractmethod
 from typing import Dict, List, Tuple
 
 from django.contrib.gis.geos import LineString, Point, Polygon
+from mstreets.cache import bump_version
 from mstreets.file_uploaders.utils import float_or_none
 from mstreets.models import Poi, Poi_Locations, Poi_Resource
 from pyproj import Transformer
@@ -155,6 +156,8 @@ class PoiLocationsUploader(ABC):
         try:
             poi_list = [self.__create_poi(poi) for poi in self.pois]
             Poi_Locations.objects.bulk_create(poi_list, batch_size=1000)  # Up to 2000
+            # bulk_create no envia post_save
+            bump_version('poi_locations')
             return True
         except Exception as e:
             print(e)
@@ -1,5 +1,8 @@
 from celery import shared_task
 
+from mstreets.hotspots import build_campaign_hotspots
+from mstreets.poi_index import update_campaign_index
+
 from .poi import CSVv2PoiUploader, CSVv3PoiUploader, GeoJSONPoiUploader
 
 
@@ -19,3 +22,5 @@ def async_handle_uploaded_file(tmp_file_path, form_data, required_fields):
     )
     file_uploader.upload_file()
     file_uploader.remove_file()
+    update_campaign_index(form_data['campaign'], file_uploader.poi_ids)
+    build_campaign_hotspots(form_data['campaign'])
@@ -0,0 +1,64 @@
+from django.contrib.gis.db.models import GeometryField
+from django.contrib.gis.db.models.functions import GeomOutputGeoFunc
+from django.db.models import FloatField, Func, TextField, Value
+
+
+class Geography(Func):
+    """Cast a EPSG:4326 geometry to geography, so distances are computed in metres.
+
+    The migrations define GiST indexes on ``geom::geography`` for Poi, PC and Zone.
+    """
+    template = '%(expressions)s::geography'
+    output_field = GeometryField(srid=4326, geography=True)
+
+
+class KNNDistance(Func):
+    """Distance operator ``<->``, which can be resolved by the GiST index when ordering."""
+    template = '%(expressions)s'
+    arg_joiner = ' <-> '
+    output_field = FloatField()
+
+
+class AsPlainGeoJSON(Func):
+    """ST_AsGeoJSON with no options, so no crs member is written for SRIDs other than 4326, like DRF."""
+    function = 'ST_AsGeoJSON'
+    output_field = TextField()
+
+    def __init__(self, expression, precision, **extra):
+        super().__init__(expression, Value(precision), Value(0), **extra)
+
+
+class SimplifyPreserveTopology(GeomOutputGeoFunc):
+    arity = 2
+
+
+class AsMVTGeom(GeomOutputGeoFunc):
+    """Transform a EPSG:3857 geometry to the coordinate space of a Mapbox Vector Tile."""
+
+    def __init__(self, expression, bounds, extent=4096, buffer=64, **extra):
+        bounds = Value(bounds, output_field=GeometryField(srid=bounds.srid))
+        super().__init__(expression, bounds, extent, buffer, True, **extra)
+
+
+class LineLocatePoint(Func):
+    """Fraction of the line length where the point is closest to the line (ST_LineLocatePoint)."""
+    function = 'ST_LineLocatePoint'
+    output_field = FloatField()
+
+    def __init__(self, line, point, **extra):
+        line = Value(line, output_field=GeometryField(srid=line.srid))
+        super().__init__(line, point, **extra)
+
+
+class X(Func):
+    function = 'ST_X'
+    output_field = FloatField()
+
+
+class Y(Func):
+    function = 'ST_Y'
+    output_field = FloatField()
+
+
+def geography_value(geom):
+    return Geography(Value(geom, output_field=GeometryField(srid=geom.srid)))
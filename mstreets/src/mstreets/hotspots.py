@@ -0,0 +1,80 @@
+import math
+from typing import Dict
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from django.db import transaction
+
+from mstreets.config import get_config_value
+from mstreets.models import Poi, Poi_Hotspot
+
+
+EARTH_RADIUS = 6371008.8  # metres
+
+# Variables de Config que defineixen els hotspots i el seu valor per defecte
+HOTSPOTS_CONFIG = {
+    'hotspots_dist_min': 4.,
+    'hotspots_dist_max': 25.,
+    'hotspots_height_max': 3.,
+}
+
+
+def get_hotspots_config() -> Dict[str, float]:
+    config = dict(HOTSPOTS_CONFIG)
+    for variable in HOTSPOTS_CONFIG:
+        value = get_config_value(variable)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            config[variable] = float(value)
+    return config
+
+
+def build_campaign_hotspots(campaign_id: int) -> int:
+    """Rebuild the Poi_Hotspot rows of the POIs of a campaign and return how many were created.
+
+    The neighbours of each POI are the POIs of the same campaign at a distance
+    between hotspots_dist_min and hotspots_dist_max and with an altitude
+    difference up to hotspots_height_max. The POIs are projected to a local
+    equirectangular plane around the campaign, which is accurate at these
+    distances, and paired with a KD-tree.
+    """
+    config = get_hotspots_config()
+    pois = Poi.objects.filter(campaign_id=campaign_id).values_list('id', 'geom', 'altitude')
+    ids = []
+    coords = []
+    for poi_id, geom, altitude in pois.iterator():
+        ids.append(poi_id)
+        coords.append((geom.x, geom.y, altitude))
+
+    hotspots = []
+    if len(ids) > 1:
+        ids = np.array(ids)
+        coords = np.array(coords)
+        lat0 = math.radians(coords[:, 1].mean())
+        xy = np.column_stack((
+            np.radians(coords[:, 0]) * math.cos(lat0) * EARTH_RADIUS,
+            np.radians(coords[:, 1]) * EARTH_RADIUS,
+        ))
+
+        pairs = cKDTree(xy).query_pairs(config['hotspots_dist_max'], output_type='ndarray')
+        # query_pairs retorna cada parella un cop, les volem en els dos sentits
+        pairs = np.concatenate((pairs, pairs[:, ::-1]))
+        delta = xy[pairs[:, 1]] - xy[pairs[:, 0]]
+        distances = np.hypot(delta[:, 0], delta[:, 1])
+        heights = coords[pairs[:, 1], 2] - coords[pairs[:, 0], 2]
+        valid = (distances >= config['hotspots_dist_min']) & (np.abs(heights) <= config['hotspots_height_max'])
+        pairs, delta, distances, heights = pairs[valid], delta[valid], distances[valid], heights[valid]
+        bearings = np.degrees(np.arctan2(delta[:, 0], delta[:, 1])) % 360
+
+        hotspots = [
+            Poi_Hotspot(poi_id=poi_id, target_id=target_id, distance=distance, bearing=bearing, height=height)
+            for poi_id, target_id, distance, bearing, height in zip(
+                ids[pairs[:, 0]].tolist(), ids[pairs[:, 1]].tolist(),
+                distances.tolist(), bearings.tolist(), heights.tolist()
+            )
+        ]
+
+    with transaction.atomic():
+        Poi_Hotspot.objects.filter(poi__campaign_id=campaign_id).delete()
+        Poi_Hotspot.objects.bulk_create(hotspots, batch_size=5000)
+    return len(hotspots)
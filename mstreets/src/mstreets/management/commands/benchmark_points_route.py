@@ -0,0 +1,99 @@
+import timeit
+
+import numpy as np
+
+from django.contrib.gis.geos import LineString, Point
+from django.core.management.base import BaseCommand
+
+from mstreets.api import POINTS_ROUTE_ENGINES, interpolate_points
+from mstreets.models import Zone
+
+
+def legacy_interpolate_points(coords, distance=1.0):
+    """Previous implementation of api.interpolate_points, kept as the benchmark baseline."""
+    distance_utm = distance / 40000000.0 * 360.0
+    coords = np.array(coords)
+    deltas = np.diff(coords, axis=0)
+    seg_lengths = np.linalg.norm(deltas, axis=1)
+    cumdist = np.concatenate([[0], np.cumsum(seg_lengths)])
+    total_length = cumdist[-1]
+    num_points = int(np.floor(total_length / distance_utm))
+    distances = np.linspace(0, total_length, num_points + 1)
+    points = []
+    seg_idx = 0
+    for d in distances:
+        while seg_idx < len(cumdist) - 2 and d > cumdist[seg_idx + 1]:
+            seg_idx += 1
+        seg_start = coords[seg_idx]
+        seg_end = coords[seg_idx + 1]
+        seg_dist = cumdist[seg_idx + 1] - cumdist[seg_idx]
+        if seg_dist == 0:
+            point = seg_start
+        else:
+            frac = (d - cumdist[seg_idx]) / seg_dist
+            point = seg_start + frac * (seg_end - seg_start)
+        points.append(tuple(point))
+
+    return [Point(pt[0], pt[1], srid=4326) for pt in points]
+
+
+def random_route(length, vertices, seed=0):
+    """Random walk of about length metres with the given number of vertices, around Barcelona."""
+    rng = np.random.default_rng(seed)
+    step = length / (vertices - 1) / 40000000.0 * 360.0
+    angles = rng.uniform(0, 2 * np.pi, vertices - 1)
+    steps = np.column_stack((np.cos(angles), np.sin(angles))) * step
+    return np.concatenate([[[2.17, 41.38]], [2.17, 41.38] + np.cumsum(steps, axis=0)])
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the interpolation of the points_route lines and, with --line, '
+        'the points_route engines on the database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lengths', nargs='+', type=int, default=[1000, 10000, 50000], help='Route lengths (m)')
+        parser.add_argument('--vertices', type=int, default=200)
+        parser.add_argument('--distance', type=float, default=3.0, help='Interpolation distance (m)')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--line', help='Route to run the engines on, as the line parameter: "lat,lng|lat,lng|..."')
+        parser.add_argument(
+            '--engines', nargs='+', choices=list(POINTS_ROUTE_ENGINES), default=list(POINTS_ROUTE_ENGINES)
+        )
+
+    def handle(self, *args, **options):
+        self.benchmark_interpolation(options)
+        if options['line']:
+            self.benchmark_engines(options)
+
+    def benchmark_engines(self, options):
+        coords = [tuple(map(float, pair.split(','))) for pair in options['line'].split('|')]
+        linestring = LineString([(lng, lat) for lat, lng in coords], srid=4326)
+        # Sense restriccions de grup: totes les zones actives que toca la línia
+        zones = Zone.objects.filter(geom__intersects=linestring).exclude(active=False)
+        for name in options['engines']:
+            engine = POINTS_ROUTE_ENGINES[name]
+            pois = engine(linestring, zones)
+            elapsed = min(timeit.repeat(lambda: engine(linestring, zones), number=1, repeat=options['repeat']))
+            self.stdout.write(f'{name}: {elapsed * 1000:.2f} ms, {len(pois)} POIs')
+
+    def benchmark_interpolation(self, options):
+        distance = options['distance']
+        for length in options['lengths']:
+            coords = random_route(length, options['vertices'])
+            legacy = np.array([(pt.x, pt.y) for pt in legacy_interpolate_points(coords, distance)])
+            current = interpolate_points(coords, distance)
+            error = np.abs(legacy - current).max()
+
+            legacy_time = min(timeit.repeat(
+                lambda: legacy_interpolate_points(coords, distance), number=1, repeat=options['repeat']
+            ))
+            current_time = min(timeit.repeat(
+                lambda: interpolate_points(coords, distance), number=1, repeat=options['repeat']
+            ))
+            self.stdout.write(
+                f'{length} m, {len(current)} points: legacy {legacy_time * 1000:.2f} ms, '
+                f'vectorized {current_time * 1000:.2f} ms ({legacy_time / current_time:.1f}x), '
+                f'max difference {error:.2e}'
+            )
@@ -0,0 +1,57 @@
+import timeit
+
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D
+from django.core.management.base import BaseCommand
+
+from mstreets.api import filter_by_zones_geom
+from mstreets.functions import Geography
+from mstreets.models import PC, Poi, Zone
+
+
+def legacy_filter_by_multiple_polygons(Model, queryset, polygons):
+    """Previous implementation of api.filter_by_zones_geom, kept as the benchmark baseline."""
+    filtered_queryset = Model.objects.none()
+    for polygon in polygons:
+        filtered_queryset = filtered_queryset | queryset.filter(geom__intersects=polygon.geom)
+    return filtered_queryset
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the filter of POIs and PCs by the permitted zones: the previous OR of '
+        'one ST_Intersects per zone against the EXISTS of api.filter_by_zones_geom'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--zones', nargs='+', type=int, default=[1, 5, 10, 50, 100], help='Numbers of zones')
+        parser.add_argument('--point', default='41.38,2.17', help='Search point, as the p parameter: "lat,lng"')
+        parser.add_argument('--radius', type=float, default=500, help='Search radius (m)')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        lat, lng = map(float, options['point'].split(','))
+        point = Point(lng, lat, srid=4326)
+        zones = Zone.objects.exclude(active=False).exclude(geom=None).order_by('id')
+        zone_ids = list(zones.values_list('id', flat=True))
+
+        for count in options['zones']:
+            if count > len(zone_ids):
+                self.stdout.write(f'{count} zones: skipped, there are only {len(zone_ids)} active zones')
+                continue
+            zones = Zone.objects.filter(pk__in=zone_ids[:count])
+            for Model in (Poi, PC):
+                queryset = Model.objects.alias(
+                    geog=Geography('geom')
+                ).filter(
+                    geog__dwithin=(point, D(m=options['radius']))
+                )
+                legacy = legacy_filter_by_multiple_polygons(Model, queryset, list(zones)).values_list('id', flat=True)
+                current = filter_by_zones_geom(queryset, zones).values_list('id', flat=True)
+                legacy_time = min(timeit.repeat(lambda: list(legacy.all()), number=1, repeat=options['repeat']))
+                current_time = min(timeit.repeat(lambda: list(current.all()), number=1, repeat=options['repeat']))
+                self.stdout.write(
+                    f'{count} zones, {Model._meta.model_name}: OR {legacy_time * 1000:.2f} ms, '
+                    f'EXISTS {current_time * 1000:.2f} ms ({legacy_time / current_time:.1f}x), '
+                    f'{len(set(current))} rows (OR: {len(set(legacy))})'
+                )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from mstreets.hotspots import build_campaign_hotspots
+from mstreets.models import Campaign
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hotspots between the POIs of the campaigns (all of them by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('campaigns', nargs='*', type=int, help='Campaign ids')
+
+    def handle(self, *args, **options):
+        campaigns = Campaign.objects.order_by('pk')
+        if options['campaigns']:
+            campaigns = campaigns.filter(pk__in=options['campaigns'])
+
+        for campaign in campaigns:
+            count = build_campaign_hotspots(campaign.pk)
+            self.stdout.write(f'{campaign}: {count} hotspots')
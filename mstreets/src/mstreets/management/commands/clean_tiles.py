@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from mstreets.tiles import clean_stale_tiles
+
+
+class Command(BaseCommand):
+    help = 'Remove the cached vector tiles of previous versions of the models, to be run periodically'
+
+    def handle(self, *args, **options):
+        removed = clean_stale_tiles()
+        self.stdout.write(f'{removed} stale tile directories removed')
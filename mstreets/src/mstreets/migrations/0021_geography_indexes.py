@@ -0,0 +1,28 @@
+# Generated by Django 3.2 on 2026-10-17 09:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mstreets', '0020_campaign_context_info_api'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS mstreets_poi_geom_geography_idx '
+            'ON mstreets_poi USING GIST ((geom::geography));',
+            'DROP INDEX IF EXISTS mstreets_poi_geom_geography_idx;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS mstreets_pc_geom_geography_idx '
+            'ON mstreets_pc USING GIST ((geom::geography));',
+            'DROP INDEX IF EXISTS mstreets_pc_geom_geography_idx;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS mstreets_zone_geom_geography_idx '
+            'ON mstreets_zone USING GIST ((geom::geography));',
+            'DROP INDEX IF EXISTS mstreets_zone_geom_geography_idx;',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-17 11:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mstreets', '0021_geography_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Poi_Hotspot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance', models.FloatField(verbose_name='Distància (m)')),
+                ('bearing', models.FloatField(help_text='Angle respecte el nord, en sentit horari', verbose_name='Rumb (graus)')),
+                ('height', models.FloatField(verbose_name="Diferència d'altura (m)")),
+                ('poi', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hotspots', to='mstreets.poi')),
+                ('target', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mstreets.poi')),
+            ],
+            options={
+                'verbose_name': 'Hotspot entre POI',
+                'verbose_name_plural': 'Hotspots entre POI',
+            },
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 3.2 on 2026-10-17 15:05
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mstreets', '0022_poi_hotspot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='zone',
+            name='geom_simplified_1m',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, null=True, srid=4326, verbose_name='Perímetre simplificat (1 m)'),
+        ),
+        migrations.AddField(
+            model_name='zone',
+            name='geom_simplified_10m',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, null=True, srid=4326, verbose_name='Perímetre simplificat (10 m)'),
+        ),
+        migrations.AddField(
+            model_name='zone',
+            name='geom_simplified_100m',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, null=True, srid=4326, verbose_name='Perímetre simplificat (100 m)'),
+        ),
+        migrations.AddField(
+            model_name='zone',
+            name='geom_simplified_1000m',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, null=True, srid=4326, verbose_name='Perímetre simplificat (1000 m)'),
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='geom_simplified_1m',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, null=True, srid=4326, verbose_name='Perímetre simplificat (1 m)'),
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='geom_simplified_10m',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, null=True, srid=4326, verbose_name='Perímetre simplificat (10 m)'),
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='geom_simplified_100m',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, null=True, srid=4326, verbose_name='Perímetre simplificat (100 m)'),
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='geom_simplified_1000m',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, null=True, srid=4326, verbose_name='Perímetre simplificat (1000 m)'),
+        ),
+        migrations.RunSQL(
+            '''
+            UPDATE mstreets_zone SET
+                geom_simplified_1m = ST_Multi(ST_SimplifyPreserveTopology(geom, 1 / 111320.)),
+                geom_simplified_10m = ST_Multi(ST_SimplifyPreserveTopology(geom, 10 / 111320.)),
+                geom_simplified_100m = ST_Multi(ST_SimplifyPreserveTopology(geom, 100 / 111320.)),
+                geom_simplified_1000m = ST_Multi(ST_SimplifyPreserveTopology(geom, 1000 / 111320.))
+            WHERE geom IS NOT NULL;
+            ''',
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            '''
+            UPDATE mstreets_campaign SET
+                geom_simplified_1m = ST_Multi(ST_SimplifyPreserveTopology(geom, 1 / 111320.)),
+                geom_simplified_10m = ST_Multi(ST_SimplifyPreserveTopology(geom, 10 / 111320.)),
+                geom_simplified_100m = ST_Multi(ST_SimplifyPreserveTopology(geom, 100 / 111320.)),
+                geom_simplified_1000m = ST_Multi(ST_SimplifyPreserveTopology(geom, 1000 / 111320.))
+            WHERE geom IS NOT NULL;
+            ''',
+            migrations.RunSQL.noop,
+        ),
+    ]
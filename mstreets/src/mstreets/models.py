@@ -24,6 +24,19 @@ class Zone(models.Model):
     poi_permission = models.BooleanField('Pot veure POI', default=True, help_text="Pot veure els punts d'interès (panorames, laterals, etc) de la zona")
     pc_permission = models.BooleanField('Pot veure PC', default=True, help_text="Pot veure els núvols de punts de la zona")
     geom = models.MultiPolygonField('Perímetre zona', srid=4326, db_index=True, null=True, blank=True)
+    # Perímetre simplificat amb ST_SimplifyPreserveTopology (mstreets.simplify), es calcula en desar
+    geom_simplified_1m = models.MultiPolygonField(
+        'Perímetre simplificat (1 m)', srid=4326, null=True, blank=True, editable=False
+    )
+    geom_simplified_10m = models.MultiPolygonField(
+        'Perímetre simplificat (10 m)', srid=4326, null=True, blank=True, editable=False
+    )
+    geom_simplified_100m = models.MultiPolygonField(
+        'Perímetre simplificat (100 m)', srid=4326, null=True, blank=True, editable=False
+    )
+    geom_simplified_1000m = models.MultiPolygonField(
+        'Perímetre simplificat (1000 m)', srid=4326, null=True, blank=True, editable=False
+    )
 
     class Meta:
         verbose_name = 'Permís territorial'
@@ -117,6 +130,19 @@ class Campaign(models.Model):
     sync_pano = models.BooleanField('Es poden sincronitzar els panorames amb els núvols de punts', default=True, null=False, blank=False)
     config = models.JSONField('Configuració de la campanya (JSON)', null=True, blank=True)
     geom = models.MultiPolygonField('Perímetre campanya', srid=4326, db_index=True, null=True, blank=True)
+    # Perímetre simplificat amb ST_SimplifyPreserveTopology (mstreets.simplify), es calcula en desar
+    geom_simplified_1m = models.MultiPolygonField(
+        'Perímetre simplificat (1 m)', srid=4326, null=True, blank=True, editable=False
+    )
+    geom_simplified_10m = models.MultiPolygonField(
+        'Perímetre simplificat (10 m)', srid=4326, null=True, blank=True, editable=False
+    )
+    geom_simplified_100m = models.MultiPolygonField(
+        'Perímetre simplificat (100 m)', srid=4326, null=True, blank=True, editable=False
+    )
+    geom_simplified_1000m = models.MultiPolygonField(
+        'Perímetre simplificat (1000 m)', srid=4326, null=True, blank=True, editable=False
+    )
     context_info_api = models.CharField(
         'Context Info API',
         max_length=55,
@@ -197,6 +223,21 @@ class Poi_Resource(models.Model):
         return '%s/%s (%s)' % (self.folder, self.filename, self.poi)
 
 
+class Poi_Hotspot(models.Model):
+    poi = models.ForeignKey(Poi, on_delete=models.CASCADE, related_name='hotspots')
+    target = models.ForeignKey(Poi, on_delete=models.CASCADE, related_name='+')
+    distance = models.FloatField('Distància (m)')
+    bearing = models.FloatField('Rumb (graus)', help_text='Angle respecte el nord, en sentit horari')
+    height = models.FloatField('Diferència d\'altura (m)')
+
+    class Meta:
+        verbose_name = 'Hotspot entre POI'
+        verbose_name_plural = 'Hotspots entre POI'
+
+    def __str__(self):
+        return '%s -> %s' % (self.poi_id, self.target_id)
+
+
 class Poi_Locations(models.Model):
     campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE)
     tag = models.CharField('Tag', max_length=255, null=True, blank=True)
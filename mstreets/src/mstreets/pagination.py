@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+from .settings import PAGINATION_MAX_LIMIT, PAGINATION_LIMIT
+
+
+class IdCursorPagination(CursorPagination):
+    """Keyset pagination by id with the limit and cursor query parameters."""
+    ordering = 'id'
+    page_size = PAGINATION_LIMIT
+    page_size_query_param = 'limit'
+    max_page_size = PAGINATION_MAX_LIMIT
+
+
+def is_paginated(request):
+    return bool(request.GET.get('limit') or request.GET.get('cursor'))
@@ -0,0 +1,80 @@
+import hashlib
+from typing import Dict, List
+
+from django.db.models import Q
+
+from mstreets.cache import get_cache, get_permissions_fingerprint, get_versions, is_shared_cache
+from mstreets.models import Zone
+
+from .settings import PERMISSIONS_CACHE_ENABLED, PERMISSIONS_CACHE_TIMEOUT
+
+
+# Models dels que depenen els permisos territorials
+PERMISSION_MODELS = ('zone', 'zonegrouppermission')
+
+
+class PermittedZones():
+    """Zones a group set can see, with their poi_permission and pc_permission flags."""
+
+    def __init__(self, zones: Dict[int, Dict[str, bool]]):
+        self.zones = zones
+
+    def get_ids(self, permission: str = None) -> List[int]:
+        """Return the permitted zone ids, optionally only those with 'poi' or 'pc' permission."""
+        if not permission:
+            return list(self.zones.keys())
+        return [zone_id for zone_id, permissions in self.zones.items() if permissions[permission]]
+
+    def queryset(self, permission: str = None):
+        return Zone.objects.filter(pk__in=self.get_ids(permission))
+
+    @property
+    def fingerprint(self) -> str:
+        return get_permissions_fingerprint(self.zones.keys())
+
+
+def get_user_group_ids(user) -> List[int]:
+    return sorted(user.groups.values_list('id', flat=True))
+
+
+def load_permitted_zones(group_ids: List[int]) -> Dict[int, Dict[str, bool]]:
+    zones = Zone.objects.filter(
+        Q(public=True) | Q(group_permissions__group__in=group_ids)
+    ).exclude(active=False).values_list('id', 'poi_permission', 'pc_permission').distinct()
+    return {
+        zone_id: {'poi': poi_permission, 'pc': pc_permission}
+        for zone_id, poi_permission, pc_permission in zones
+    }
+
+
+def is_permissions_cache_enabled() -> bool:
+    return PERMISSIONS_CACHE_ENABLED and is_shared_cache()
+
+
+def get_group_permitted_zones(group_ids: List[int]) -> PermittedZones:
+    """Return the zones of the group set, cached with PERMISSIONS_CACHE_ENABLED and a shared cache."""
+    if not is_permissions_cache_enabled():
+        return PermittedZones(load_permitted_zones(group_ids))
+
+    versions = sorted(get_versions(PERMISSION_MODELS).items())
+    raw = repr((group_ids, versions))
+    key = 'mstreets:permitted_zones:' + hashlib.sha1(raw.encode()).hexdigest()
+    cache = get_cache()
+    zones = cache.get(key)
+    if zones is None:
+        zones = load_permitted_zones(group_ids)
+        cache.set(key, zones, PERMISSIONS_CACHE_TIMEOUT)
+    return PermittedZones(zones)
+
+
+def get_permitted_zones(request) -> PermittedZones:
+    """Return the zones the user of the request can see.
+
+    The result is kept in the request so it is resolved once, and can be
+    cached by group set between requests (see get_group_permitted_zones).
+    """
+    permitted_zones = getattr(request, '_mstreets_permitted_zones', None)
+    if permitted_zones is None:
+        permitted_zones = get_group_permitted_zones(get_user_group_ids(request.user))
+        request._mstreets_permitted_zones = permitted_zones
+    return permitted_zones
@@ -0,0 +1,151 @@
+import fcntl
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Tuple
+
+import numpy as np
+
+from django.db import transaction
+
+from mstreets.functions import X, Y
+from mstreets.models import Poi
+
+from .settings import POI_INDEX_ROOT
+
+
+# Una fila per POI, ordenades per longitud per poder retallar per bbox amb searchsorted
+POI_INDEX_DTYPE = np.dtype([('id', '<i8'), ('lng', '<f8'), ('lat', '<f8')])
+
+# Índexs mapejats pel procés: {campaign_id: (mtime_ns, array)}
+_indexes = {}
+# POIs canviats per fil i campanya, pendents d'actualitzar a l'índex quan es faci el commit
+_pending = threading.local()
+
+
+def get_index_path(campaign_id: int) -> str:
+    return os.path.join(POI_INDEX_ROOT, f'{campaign_id}.npy')
+
+
+@contextmanager
+def index_lock(campaign_id: int):
+    """Serialize the writes of the index of a campaign between processes."""
+    os.makedirs(POI_INDEX_ROOT, exist_ok=True)
+    with open(f'{get_index_path(campaign_id)}.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def get_poi_rows(campaign_id: int, poi_ids=None) -> np.ndarray:
+    pois = Poi.objects.filter(campaign_id=campaign_id)
+    if poi_ids is not None:
+        pois = pois.filter(pk__in=list(poi_ids))
+    rows = pois.values_list('id', X('geom'), Y('geom'))
+    return np.array(list(rows.iterator()), dtype=POI_INDEX_DTYPE)
+
+
+def write_index(campaign_id: int, index: np.ndarray) -> None:
+    index.sort(order='lng')
+    path = get_index_path(campaign_id)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, index)
+    # Els processos que el tenen mapejat continuen llegint el fitxer anterior fins que el tornen a obrir
+    os.replace(tmp_path, path)
+
+
+def build_campaign_index(campaign_id: int) -> None:
+    """Write the coordinate index of the POIs of a campaign."""
+    with index_lock(campaign_id):
+        write_index(campaign_id, get_poi_rows(campaign_id))
+
+
+def update_campaign_index(campaign_id: int, poi_ids: Iterable[int]) -> None:
+    """Update the rows of poi_ids in the index of a campaign.
+
+    The rows of poi_ids are removed and the POIs that still belong to the
+    campaign are read again, so it works for created, moved and deleted POIs.
+    The index is built whole if it does not exist yet.
+    """
+    poi_ids = list(poi_ids)
+    with index_lock(campaign_id):
+        try:
+            index = np.load(get_index_path(campaign_id))
+        except FileNotFoundError:
+            write_index(campaign_id, get_poi_rows(campaign_id))
+            return
+        if not poi_ids:
+            return
+        index = index[~np.isin(index['id'], poi_ids)]
+        write_index(campaign_id, np.concatenate((index, get_poi_rows(campaign_id, poi_ids))))
+
+
+def _run_pending_update(campaign_id: int) -> None:
+    poi_ids = _pending.ids.pop(campaign_id, None)
+    if poi_ids:
+        update_campaign_index(campaign_id, poi_ids)
+
+
+def schedule_index_update(campaign_id: int, poi_id: int) -> None:
+    """Update the index of the campaign with the POI when the transaction is committed.
+
+    The POIs of a transaction are grouped by campaign, so deleting a campaign
+    with all its POIs rewrites the index once.
+    """
+    if not hasattr(_pending, 'ids'):
+        _pending.ids = {}
+    _pending.ids.setdefault(campaign_id, set()).add(poi_id)
+    transaction.on_commit(lambda: _run_pending_update(campaign_id))
+
+
+def invalidate_campaign_index(campaign_id: int) -> None:
+    """Remove the index of a campaign."""
+    try:
+        os.remove(get_index_path(campaign_id))
+    except OSError:
+        pass
+
+
+def _load_campaign_index(campaign_id: int) -> np.ndarray:
+    path = get_index_path(campaign_id)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _indexes.get(campaign_id)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    index = np.load(path, mmap_mode='r')
+    _indexes[campaign_id] = (mtime, index)
+    return index
+
+
+def load_campaign_index(campaign_id: int) -> np.ndarray:
+    """Return the memory-mapped index of a campaign, building it if it does not exist.
+
+    The indexes are kept up to date after uploads and POI changes, so it is
+    only built here the first time. The mapping is kept by the process and
+    reopened when the file is replaced.
+    """
+    try:
+        return _load_campaign_index(campaign_id)
+    except FileNotFoundError:
+        build_campaign_index(campaign_id)
+        return _load_campaign_index(campaign_id)
+
+
+def query_bbox(campaign_ids: Iterable[int], bbox: Tuple[float, float, float, float]) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the ids and the (n, 2) lng/lat coordinates of the POIs of the campaigns inside bbox."""
+    min_x, min_y, max_x, max_y = bbox
+    ids = []
+    coords = []
+    for campaign_id in campaign_ids:
+        index = load_campaign_index(campaign_id)
+        # Només es llegeixen les pàgines del rang de longituds de la bbox
+        start = np.searchsorted(index['lng'], min_x, side='left')
+        end = np.searchsorted(index['lng'], max_x, side='right')
+        rows = index[start:end]
+        rows = rows[(rows['lat'] >= min_y) & (rows['lat'] <= max_y)]
+        ids.append(rows['id'])
+        coords.append(np.column_stack((rows['lng'], rows['lat'])))
+
+    if not ids:
+        return np.empty(0, dtype='<i8'), np.empty((0, 2))
+    return np.concatenate(ids), np.concatenate(coords)
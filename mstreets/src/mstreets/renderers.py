@@ -0,0 +1,165 @@
+import json
+import os
+import tempfile
+
+import fiona
+import msgpack
+from fiona.crs import CRS
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# Tipus de les propietats a l'esquema de la capa FlatGeobuf, en ordre de prioritat
+PROPERTY_TYPES = ((bool, 'bool'), (int, 'int'), (float, 'float'), (str, 'str'))
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Render the response data with MessagePack, with the same layout as the JSON output."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=JSONEncoder().default)
+
+
+def get_feature_collection_data(data):
+    """Return the GeoJSON FeatureCollection of the data of a POI or PC response, or None."""
+    if isinstance(data, dict) and data.get('type') == 'FeatureCollection':
+        return data
+    if isinstance(data, dict) and data.get('type') == 'Feature':
+        return {'type': 'FeatureCollection', 'features': [data]}
+    # Pàgina de la paginació per cursor (paràmetres limit i cursor)
+    if isinstance(data, dict) and 'results' in data:
+        return get_feature_collection_data(data['results'])
+    # /api/search amb un sol tipus de resultat (paràmetre f)
+    if isinstance(data, dict) and len(data) == 1:
+        return get_feature_collection_data(next(iter(data.values())))
+    return None
+
+
+def get_property_type(value):
+    for python_type, field_type in PROPERTY_TYPES:
+        if isinstance(value, python_type):
+            return field_type
+    return None
+
+
+def get_schema(features):
+    """Return the fiona schema of GeoJSON features; nested or mixed properties are written as text."""
+    names = {}
+    for feature in features:
+        names.update(dict.fromkeys(feature['properties'] or {}))
+    properties = {}
+    for name in names:
+        values = [(feature['properties'] or {}).get(name) for feature in features]
+        types = {get_property_type(value) for value in values if value is not None}
+        if types in ({'float'}, {'int', 'float'}):
+            properties[name] = 'float'
+        elif len(types) == 1 and None not in types:
+            properties[name] = types.pop()
+        else:
+            properties[name] = 'str'
+    geometry_types = {feature['geometry']['type'] for feature in features if feature['geometry']}
+    geometry = geometry_types.pop() if len(geometry_types) == 1 else 'Unknown'
+    return {'geometry': geometry, 'properties': properties}
+
+
+def to_fiona_feature(feature, schema):
+    properties = dict(id=feature.get('id'), **(feature['properties'] or {}))
+    for name, field_type in schema['properties'].items():
+        value = properties.get(name)
+        if field_type == 'str' and value is not None and not isinstance(value, str):
+            properties[name] = json.dumps(value, cls=JSONEncoder)
+    return {'geometry': feature['geometry'], 'properties': properties}
+
+
+class FlatGeobufRenderer(BaseRenderer):
+    """Render a POI or PC FeatureCollection as a FlatGeobuf file with its spatial index.
+
+    The properties are the ones of the serializer, with the feature id as the
+    id property. Nested values like resources or config are written as JSON
+    text. The next and previous links of a paginated response go in the Link
+    header. Data that is not a FeatureCollection, like errors, is rendered as JSON.
+    """
+    media_type = 'application/flatgeobuf'
+    format = 'fgb'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        collection = get_feature_collection_data(data)
+        if collection is None:
+            response = renderer_context.get('response')
+            if response is not None:
+                response['Content-Type'] = 'application/json'
+            return JSONRenderer().render(data, renderer_context=renderer_context)
+
+        response = renderer_context.get('response')
+        if response is not None and isinstance(data, dict) and 'results' in data:
+            links = [f'<{data[rel]}>; rel="{rel}"' for rel in ('next', 'previous') if data.get(rel)]
+            if links:
+                response['Link'] = ', '.join(links)
+
+        features = collection['features']
+        schema = get_schema(features)
+        schema['properties'] = {'id': 'int', **schema['properties']}
+        request = renderer_context.get('request')
+        epsg = request.GET.get('epsg') if request is not None else None
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'features.fgb')
+            with fiona.open(
+                path, 'w', driver='FlatGeobuf', schema=schema,
+                crs=CRS.from_epsg(int(epsg or 4326)), SPATIAL_INDEX='YES'
+            ) as layer:
+                layer.writerecords(to_fiona_feature(feature, schema) for feature in features)
+            with open(path, 'rb') as f:
+                return f.read()
+
+
+class ExportRenderer(JSONRenderer):
+    """Negotiate a format of the campaign export with Accept or format=.
+
+    The export view streams the file itself, so these renderers only render
+    the errors, as JSON.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class GeoJSONExportRenderer(ExportRenderer):
+    media_type = 'application/geo+json'
+    format = 'geojson'
+
+
+class CSVExportRenderer(ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class FlatGeobufExportRenderer(ExportRenderer):
+    media_type = 'application/flatgeobuf'
+    format = 'fgb'
+
+
+EXPORT_RENDERER_CLASSES = [GeoJSONExportRenderer, CSVExportRenderer, FlatGeobufExportRenderer]
+
+BINARY_RENDERERS = (MessagePackRenderer, FlatGeobufRenderer)
+# Renderers de les vistes de POIs i PCs
+POI_PC_RENDERER_CLASSES = list(api_settings.DEFAULT_RENDERER_CLASSES) + list(BINARY_RENDERERS)
+
+
+def is_binary_request(request) -> bool:
+    """Whether the negotiated renderer is binary, so the response can't be JSON text from PostGIS."""
+    return isinstance(getattr(request, 'accepted_renderer', None), BINARY_RENDERERS)
@@ -1,7 +1,64 @@
 from rest_framework import serializers
+from rest_framework_gis.fields import GeometryField
 from rest_framework_gis.serializers import GeoFeatureModelSerializer
 
-from mstreets.models import PC, Animation, Campaign, Campaign_Category, Config, Metadata, Poi, Poi_Resource, Zone
+from mstreets.models import (
+    PC, Animation, Campaign, Campaign_Category, Config, Metadata, Poi, Poi_Hotspot, Poi_Resource, Zone
+)
+
+
+class GeomSourceMixin():
+    """Read the geom field from the attribute given in the geom_source context key.
+
+    Used to serialize the geometry reprojected or simplified in the database by api.transform_geom_epsg.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        geom_source = self.context.get('geom_source')
+        if geom_source:
+            fields['geom'] = GeometryField(source=geom_source, read_only=True)
+        return fields
+
+
+def select_output_fields(names, meta, context):
+    """Return the names of the fields to output with the fields and omit context keys.
+
+    The id and geometry fields are always kept.
+    """
+    only = context.get('fields')
+    omit = context.get('omit') or ()
+    required = (getattr(meta, 'id_field', 'id'), getattr(meta, 'geo_field', None))
+    return [
+        name for name in names
+        if name in required or ((not only or name in only) and name not in omit)
+    ]
+
+
+def round_coordinates(coordinates, precision):
+    if isinstance(coordinates, (list, tuple)):
+        return [round_coordinates(value, precision) for value in coordinates]
+    return round(coordinates, precision)
+
+
+class OutputOptionsMixin():
+    """Restrict the fields and round the coordinates with the fields, omit and precision context keys.
+
+    The context is built by api.get_output_context from the request parameters.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        names = select_output_fields(fields.keys(), self.Meta, self.context)
+        return {name: fields[name] for name in names}
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        precision = self.context.get('precision')
+        geometry = data.get('geometry', data.get('geom'))
+        if precision is not None and geometry and 'coordinates' in geometry:
+            geometry['coordinates'] = round_coordinates(geometry['coordinates'], precision)
+        return data
 
 
 class ConfigSerializer(serializers.ModelSerializer):
@@ -22,7 +79,7 @@ class Campaign_CategorySerializer(serializers.ModelSerializer):
         fields = ('name', 'order')
 
 
-class CampaignSerializer(serializers.ModelSerializer):
+class CampaignSerializer(GeomSourceMixin, serializers.ModelSerializer):
     metadata = MetadataSerializer(many=False)
     category = Campaign_CategorySerializer(many=False)
     epsg_name = serializers.SerializerMethodField()
@@ -38,7 +95,7 @@ class CampaignSerializer(serializers.ModelSerializer):
                   'config', 'geom')
 
 
-class ZoneSerializer(GeoFeatureModelSerializer):
+class ZoneSerializer(GeomSourceMixin, GeoFeatureModelSerializer):
     class Meta:
         model = Zone
         geo_field = 'geom'
@@ -52,8 +109,10 @@ class Poi_ResourceSerializer(serializers.ModelSerializer):
         fields = ('filename', 'format', 'pan', 'pitch', 'folder', 'tag')
 
 
-class PoiSerializer(GeoFeatureModelSerializer):
+class PoiSerializer(OutputOptionsMixin, GeomSourceMixin, GeoFeatureModelSerializer):
     resources = Poi_ResourceSerializer(many=True, read_only=True)
+    # Valors dels camps quan l'usuari no té permís per veure el POI
+    permission_masked_fields = {'id': -1, 'filename': None, 'folder': None}
 
     class Meta:
         model = Poi
@@ -62,8 +121,26 @@ class PoiSerializer(GeoFeatureModelSerializer):
                   'roll', 'pitch', 'pan', 'angle_width', 'angle_height', 'angle_height_offset',
                   'folder', 'tag', 'config', 'geom', 'resources')
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # has_poi_permission és una anotació de api.get_pois
+        if not getattr(instance, 'has_poi_permission', True):
+            properties = data['properties']
+            for field, value in self.permission_masked_fields.items():
+                if field in data:
+                    data[field] = value
+                elif field in properties:
+                    properties[field] = value
+        return data
+
+
+class Poi_HotspotSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Poi_Hotspot
+        fields = ('target', 'distance', 'bearing', 'height')
+
 
-class PCSerializer(GeoFeatureModelSerializer):
+class PCSerializer(OutputOptionsMixin, GeomSourceMixin, GeoFeatureModelSerializer):
     class Meta:
         model = PC
         geo_field = 'geom'
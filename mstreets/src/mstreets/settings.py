@@ -14,3 +14,58 @@ AWS_S3_REGION_NAME = PANORAMAS_BUCKET_REGION
 AWS_S3_ENDPOINT_URL = f'https://{PANORAMAS_BUCKET_REGION}.linodeobjects.com'
 AWS_ACCESS_KEY_ID = PANORAMAS_BUCKET_ACCESS_KEY
 AWS_SECRET_ACCESS_KEY = PANORAMAS_BUCKET_SECRET_KEY
+
+# Cache (alias de django.core.cache.caches) on es desen les versions dels models i les respostes
+MSTREETS_CACHE_ALIAS = os.environ.get('MSTREETS_CACHE_ALIAS', 'default')
+
+# Zones permeses per cada conjunt de grups, desades a la cache entre peticions. Només s'activa amb una
+# cache compartida entre workers (no LocMemCache), perquè la invalidació és la versió desada a la mateixa cache
+PERMISSIONS_CACHE_ENABLED = os.environ.get('PERMISSIONS_CACHE_ENABLED', 'false').lower() == 'true'
+PERMISSIONS_CACHE_TIMEOUT = int(os.environ.get('PERMISSIONS_CACHE_TIMEOUT', 60 * 60 * 24))  # segons
+
+SEARCH_CACHE_ENABLED = os.environ.get('SEARCH_CACHE_ENABLED', 'false').lower() == 'true'
+SEARCH_CACHE_TIMEOUT = int(os.environ.get('SEARCH_CACHE_TIMEOUT', 300))  # segons
+SEARCH_CACHE_CELL_SIZE = float(os.environ.get('SEARCH_CACHE_CELL_SIZE', 2))  # metres
+SEARCH_CACHE_RADIUS_STEP = int(os.environ.get('SEARCH_CACHE_RADIUS_STEP', 1))  # metres
+
+# Nombre màxim de punts de /api/search/batch
+SEARCH_BATCH_MAX_POINTS = int(os.environ.get('SEARCH_BATCH_MAX_POINTS', 100))
+
+# Endpoints que generen el GeoJSON directament a PostGIS (search, pc, zone), separats per comes
+DB_GEOJSON_ENDPOINTS = [
+    endpoint.strip() for endpoint in os.environ.get('DB_GEOJSON_ENDPOINTS', '').split(',') if endpoint.strip()
+]
+
+# Paginació (limit/cursor) i streaming (stream=true) dels llistats
+PAGINATION_LIMIT = int(os.environ.get('PAGINATION_LIMIT', 500))
+PAGINATION_MAX_LIMIT = int(os.environ.get('PAGINATION_MAX_LIMIT', 5000))
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 2000))
+
+# Tessel·les vectorials (/api/tiles/<layer>/<z>/<x>/<y>.mvt)
+TILES_CACHE_ROOT = os.environ.get(
+    'TILES_CACHE_ROOT', os.path.join(settings.MEDIA_ROOT, 'mstreets', 'tiles')).rstrip('/')
+TILES_MAX_AGE = int(os.environ.get('TILES_MAX_AGE', 60 * 60 * 24 * 7))  # segons
+TILES_SIMPLIFY_PIXELS = float(os.environ.get('TILES_SIMPLIFY_PIXELS', 1))
+TILES_THINNING_PIXELS = float(os.environ.get('TILES_THINNING_PIXELS', 4))
+TILES_THINNING_MAX_ZOOM = int(os.environ.get('TILES_THINNING_MAX_ZOOM', 17))
+
+# Índex de coordenades dels POIs per campanya, mapejat en memòria per /api/points_route
+POI_INDEX_ENABLED = os.environ.get('POI_INDEX_ENABLED', 'true').lower() == 'true'
+POI_INDEX_ROOT = os.environ.get(
+    'POI_INDEX_ROOT', os.path.join(settings.MEDIA_ROOT, 'mstreets', 'poi_index')).rstrip('/')
+
+# Nombre màxim de POIs de /api/poi/nearest i candidats per POI que es reordenen per prioritat
+NEAREST_MAX_K = int(os.environ.get('NEAREST_MAX_K', 100))
+NEAREST_CANDIDATES_FACTOR = int(os.environ.get('NEAREST_CANDIDATES_FACTOR', 10))
+
+# Peticions a les APIs d'informació de context (tenants/*/context_info.py)
+CONTEXT_INFO_CONNECT_TIMEOUT = float(os.environ.get('CONTEXT_INFO_CONNECT_TIMEOUT', 3))  # segons
+CONTEXT_INFO_READ_TIMEOUT = float(os.environ.get('CONTEXT_INFO_READ_TIMEOUT', 10))  # segons
+CONTEXT_INFO_POOL_SIZE = int(os.environ.get('CONTEXT_INFO_POOL_SIZE', 10))
+# Temps (segons) que es desen les respostes, 0 per no desar-les, i decimals de lat/lng de la clau
+CONTEXT_INFO_CACHE_TIMEOUT = int(os.environ.get('CONTEXT_INFO_CACHE_TIMEOUT', 60 * 60 * 24))
+CONTEXT_INFO_CACHE_PRECISION = int(os.environ.get('CONTEXT_INFO_CACHE_PRECISION', 4))  # ~10 m
+
+# Segons que cada procés fa servir la còpia de Config sense tornar-la a llegir, sense una cache compartida
+# (amb una cache compartida es torna a llegir quan canvia)
+CONFIG_CACHE_TIMEOUT = int(os.environ.get('CONFIG_CACHE_TIMEOUT', 30))
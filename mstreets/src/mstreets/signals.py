@@ -0,0 +1,60 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.db import transaction
+from django.dispatch import receiver
+
+from mstreets.cache import schedule_version_bump
+from mstreets.models import (
+    PC, Animation, Campaign, Campaign_Category, Config, Metadata, Poi, Poi_Locations, Poi_Resource, Zone,
+    ZoneGroupPermission
+)
+from mstreets.poi_index import invalidate_campaign_index, schedule_index_update
+from mstreets.simplify import update_simplified_geoms
+
+
+VERSIONED_MODELS = (
+    Poi, Poi_Resource, Poi_Locations, PC, Campaign, Campaign_Category, Metadata, Zone, ZoneGroupPermission,
+    Animation, Config
+)
+
+
+def bump_model_version(sender, **kwargs):
+    schedule_version_bump(sender._meta.model_name)
+
+
+# Només els models versionats: un receptor sense sender impediria el fast delete de tots els models
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_model_version, sender=model)
+    post_delete.connect(bump_model_version, sender=model)
+
+
+@receiver(m2m_changed, sender=Campaign.zones.through)
+def bump_campaign_zones_version(sender, **kwargs):
+    schedule_version_bump(Campaign._meta.model_name)
+
+
+@receiver(pre_save, sender=Poi)
+def keep_poi_campaign(sender, instance, **kwargs):
+    # Campanya anterior del POI, per treure'l del seu índex si canvia de campanya
+    if instance.pk:
+        instance._index_campaign_id = Poi.objects.filter(pk=instance.pk).values_list('campaign_id', flat=True).first()
+
+
+@receiver(post_save, sender=Poi)
+@receiver(post_delete, sender=Poi)
+def update_poi_index(sender, instance, **kwargs):
+    schedule_index_update(instance.campaign_id, instance.pk)
+    previous_campaign_id = getattr(instance, '_index_campaign_id', None)
+    if previous_campaign_id and previous_campaign_id != instance.campaign_id:
+        schedule_index_update(previous_campaign_id, instance.pk)
+
+
+@receiver(post_delete, sender=Campaign)
+def remove_campaign_index(sender, instance, **kwargs):
+    campaign_id = instance.pk
+    transaction.on_commit(lambda: invalidate_campaign_index(campaign_id))
+
+
+@receiver(pre_save, sender=Zone)
+@receiver(pre_save, sender=Campaign)
+def simplify_geoms(sender, instance, **kwargs):
+    update_simplified_geoms(instance)
@@ -0,0 +1,43 @@
+from django.contrib.gis.geos import MultiPolygon, Polygon
+
+from mstreets.tiles import MAX_ZOOM, WEB_MERCATOR_ORIGIN
+
+
+METRES_PER_DEGREE = 111320.
+
+# Geometries simplificades que es guarden a Zone i Campaign: tolerància (metres) -> camp
+SIMPLIFIED_GEOMS = {
+    1: 'geom_simplified_1m',
+    10: 'geom_simplified_10m',
+    100: 'geom_simplified_100m',
+    1000: 'geom_simplified_1000m',
+}
+
+
+def simplify_geom(geom, tolerance):
+    """Simplify a (multi)polygon with a tolerance in metres, keeping it a valid MultiPolygon."""
+    if geom is None:
+        return None
+    simplified = geom.simplify(tolerance / METRES_PER_DEGREE, preserve_topology=True)
+    if isinstance(simplified, Polygon):
+        simplified = MultiPolygon(simplified, srid=geom.srid)
+    return simplified
+
+
+def update_simplified_geoms(instance) -> None:
+    for tolerance, field in SIMPLIFIED_GEOMS.items():
+        setattr(instance, field, simplify_geom(instance.geom, tolerance))
+
+
+def get_simplified_field(tolerance: float):
+    """Return the stored geometry with the largest tolerance not above tolerance (metres), if any."""
+    tolerances = [level for level in SIMPLIFIED_GEOMS if level <= tolerance]
+    if not tolerances:
+        return None
+    return SIMPLIFIED_GEOMS[max(tolerances)]
+
+
+def get_zoom_tolerance(zoom: int) -> float:
+    """Size in metres of a pixel of a 256 px tile at zoom, on the equator. zoom is clamped to 0-MAX_ZOOM."""
+    zoom = min(max(zoom, 0), MAX_ZOOM)
+    return 2 * WEB_MERCATOR_ORIGIN / 256 / 2 ** zoom
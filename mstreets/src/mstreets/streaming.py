@@ -0,0 +1,46 @@
+import json
+from itertools import islice
+
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_gis.serializers import GeoFeatureModelSerializer
+
+from .settings import STREAM_CHUNK_SIZE
+
+
+def iter_chunks(queryset, chunk_size=STREAM_CHUNK_SIZE):
+    """Iterate the queryset with a server side cursor, yielding lists of chunk_size objects.
+
+    QuerySet.iterator ignores prefetch_related, so the prefetches are done per chunk.
+    """
+    lookups = queryset._prefetch_related_lookups
+    iterator = queryset.prefetch_related(None).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        if lookups:
+            prefetch_related_objects(chunk, *lookups)
+        yield chunk
+
+
+def iter_serialized_json(queryset, Serializer, context=None, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield the JSON of Serializer(queryset, many=True) by chunks."""
+    geojson = issubclass(Serializer, GeoFeatureModelSerializer)
+    yield '{"type": "FeatureCollection", "features": [' if geojson else '['
+    separator = ''
+    for chunk in iter_chunks(queryset, chunk_size):
+        data = Serializer(chunk, many=True, context=context or {}).data
+        items = data['features'] if geojson else data
+        for item in items:
+            yield separator + json.dumps(item, cls=JSONEncoder)
+            separator = ', '
+    yield ']}' if geojson else ']'
+
+
+def streaming_json_response(queryset, Serializer, context=None):
+    return StreamingHttpResponse(
+        iter_serialized_json(queryset, Serializer, context),
+        content_type='application/json',
+    )
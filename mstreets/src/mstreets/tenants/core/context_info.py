@@ -1,13 +1,34 @@
 from abc import ABC, abstractmethod
-from typing import Dict, List, Union
+from typing import Dict, List, Optional, Union
 
 import requests
 
+from requests.adapters import HTTPAdapter
 from requests.exceptions import ConnectionError
 
+from ...cache import get_cache
+from ...settings import (
+    CONTEXT_INFO_CACHE_PRECISION, CONTEXT_INFO_CACHE_TIMEOUT, CONTEXT_INFO_CONNECT_TIMEOUT,
+    CONTEXT_INFO_POOL_SIZE, CONTEXT_INFO_READ_TIMEOUT
+)
 from ..utils import import_tenant_attribute
 
 
+# Sessió compartida pel procés, per reaprofitar les connexions (i el TLS) amb els serveis remots
+_session = None
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=CONTEXT_INFO_POOL_SIZE, pool_maxsize=CONTEXT_INFO_POOL_SIZE)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _session = session
+    return _session
+
+
 class RemoteServiceUnavailable(ConnectionError):
     def __init__(self):
         super().__init__('Remote service unavailable')
@@ -18,6 +39,8 @@ class ContextInfoAPI(ABC):
     label = None
     subtitle = None
     data_fields = None
+    # Decimals de lat/lng de la clau de la cache, per defecte CONTEXT_INFO_CACHE_PRECISION
+    cache_precision = None
 
     def __init__(self, *args, **kwargs):
         required = ('id', 'label', 'subtitle', 'data_fields')
@@ -38,14 +61,33 @@ class ContextInfoAPI(ABC):
         The list should contain the value sin the same order the data_fields were provided.
         """
 
+    def get_cache_key(self, lat: float, lng: float) -> Optional[str]:
+        """Return the cache key of the point, rounded so near points share it, or None to not cache it."""
+        precision = CONTEXT_INFO_CACHE_PRECISION if self.cache_precision is None else self.cache_precision
+        try:
+            lat, lng = round(float(lat), precision), round(float(lng), precision)
+        except (TypeError, ValueError):
+            return None
+        return f'mstreets:context_info:{self.id}:{lat:.{precision}f}:{lng:.{precision}f}'
+
     def get(self, lat: float, lng: float) -> Dict:
+        cache_key = self.get_cache_key(lat, lng) if CONTEXT_INFO_CACHE_TIMEOUT else None
+        if cache_key:
+            cached = get_cache().get(cache_key)
+            if cached is not None:
+                return cached
+
         url = self.get_url(lat, lng)
         try:
-            api_response = requests.get(url)
-        except requests.exceptions.ConnectionError as ex:
+            api_response = get_session().get(url, timeout=(CONTEXT_INFO_CONNECT_TIMEOUT, CONTEXT_INFO_READ_TIMEOUT))
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as ex:
             raise RemoteServiceUnavailable() from ex
         values = self.get_values(api_response)
-        return self.get_response_object(values)
+        response = self.get_response_object(values)
+        # Els errors del servei remot no es desen, es tornen a demanar
+        if cache_key and api_response.ok:
+            get_cache().set(cache_key, response, CONTEXT_INFO_CACHE_TIMEOUT)
+        return response
 
     def get_response_object(self, values: List[Union[str, int, float]] = None) -> Dict:
         context_data = [
@@ -1,3 +1,524 @@
-from django.test import TestCase
+import datetime
+import json
+import math
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import msgpack
+from fiona.io import MemoryFile
+
+from django.contrib.gis.geos import LineString, MultiPolygon, Point, Polygon
+from django.db import connection
+from django.db.models.deletion import Collector
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from rest_framework.utils.encoders import JSONEncoder
+
+from mstreets.api import (
+    METRES_PER_DEGREE, campaign_list, get_pois, get_pois_lat_lng_along_line, get_pois_lat_lng_along_line_from_index,
+    get_serializer_context, pc_list, points_route_batch, poi_list, search, search_batch, transform_geom_epsg
+)
+from mstreets.cache import get_cache
+from mstreets.db_geojson import get_feature_collection
+from mstreets.models import PC, Campaign, Campaign_Category, Metadata, Poi, Poi_Hotspot, Poi_Resource, Zone
+from mstreets.serializers import PoiSerializer
+from mstreets.settings import MSTREETS_CACHE_ALIAS
+from mstreets.tenants.core.context_info import ICGCRoadPK, RemoteServiceUnavailable
+
+
+# Punt al voltant del qual es creen les dades de prova (lng, lat)
+ORIGIN = (2.17, 41.38)
+SEARCH_PARAMS = {'p': f'{ORIGIN[1]},{ORIGIN[0]}', 'r': 500}
+
+
+class MstreetsDataMixin():
+    """Create zones, campaigns and POIs around ORIGIN, all of them inside every zone."""
+
+    def setUp(self):
+        super().setUp()
+        self.factory = APIRequestFactory()
+        self.created = 0
+
+    def create_zones(self, count, **kwargs):
+        lng, lat = ORIGIN
+        polygon = Polygon.from_bbox((lng - 0.01, lat - 0.01, lng + 0.01, lat + 0.01))
+        zones = []
+        for _ in range(count):
+            self.created += 1
+            zones.append(Zone.objects.create(
+                name=f'Zona {self.created}', public=True, geom=MultiPolygon(polygon, srid=4326), **kwargs
+            ))
+        return zones
+
+    def create_campaigns(self, count, zones, **kwargs):
+        campaigns = []
+        for index in range(count):
+            self.created += 1
+            campaign = Campaign.objects.create(
+                name=f'Campanya {self.created}', date_start=datetime.date(2024, 1, 1),
+                date_fi=datetime.date(2024, 12, 31), **kwargs
+            )
+            campaign.zones.set([zones[index % len(zones)]])
+            campaigns.append(campaign)
+        return campaigns
+
+    def create_pois(self, count, campaigns, resources=1):
+        lng, lat = ORIGIN
+        pois = []
+        for index in range(count):
+            self.created += 1
+            campaign = campaigns[index % len(campaigns)]
+            poi = Poi.objects.create(
+                campaign=campaign, filename=f'{self.created}.jpg', format='JPG', type='PANO',
+                date=timezone.now(), altitude=10., roll=0., pitch=0., pan=0., folder='pano',
+                geom=Point(lng + self.created * 1e-6, lat, srid=4326)
+            )
+            for resource in range(resources):
+                Poi_Resource.objects.create(
+                    campaign=campaign, poi=poi, filename=f'{self.created}_{resource}.jpg', format='JPG'
+                )
+            pois.append(poi)
+        return pois
+
+    def create_data(self, zones, campaigns, pois, **zone_kwargs):
+        zones = self.create_zones(zones, **zone_kwargs)
+        campaigns = self.create_campaigns(campaigns, zones)
+        return self.create_pois(pois, campaigns)
+
+    def get(self, view, params=None, *args, **kwargs):
+        return view(self.factory.get('/', params or {}), *args, **kwargs)
+
+    def count_queries(self, view, params=None, *args, **kwargs):
+        """Return the queries of a request to view, after a first request that fills the caches."""
+        self.get(view, params, *args, **kwargs)
+        with CaptureQueriesContext(connection) as queries:
+            self.get(view, params, *args, **kwargs)
+        return len(queries)
+
+
+class SearchQueryCountTest(MstreetsDataMixin, TestCase):
+
+    def test_query_count_does_not_grow_with_data(self):
+        self.create_data(zones=1, campaigns=1, pois=1)
+        count = self.count_queries(search, SEARCH_PARAMS)
+
+        self.create_data(zones=10, campaigns=20, pois=200)
+        # Zones sense poi_permission: els seus POIs es retornen emmascarats
+        self.create_data(zones=5, campaigns=10, pois=100, poi_permission=False)
+        self.get(search, SEARCH_PARAMS)
+        with self.assertNumQueries(count):
+            response = self.get(search, SEARCH_PARAMS)
+
+        self.assertEqual(response.status_code, 200)
+        pois = response.data['poi']['features']
+        self.assertEqual(len(pois), 301)
+        self.assertEqual(len([poi for poi in pois if poi['id'] == -1]), 100)
+
+    def test_masked_pois_are_not_modified(self):
+        self.create_data(zones=1, campaigns=1, pois=2, poi_permission=False)
+        pois = list(get_pois({}, Zone.objects.all(), Point(*ORIGIN, srid=4326), 500))
+        features = PoiSerializer(pois, many=True).data['features']
+
+        self.assertEqual([feature['id'] for feature in features], [-1, -1])
+        self.assertEqual({feature['properties']['filename'] for feature in features}, {None})
+        self.assertEqual([poi.pk for poi in pois], list(Poi.objects.order_by('pk').values_list('pk', flat=True)))
+        self.assertTrue(all(poi.filename for poi in pois))
+
+
+class SearchBatchTest(MstreetsDataMixin, TestCase):
+    """Each entry of /api/search/batch must be the /api/search response of its parameters."""
+
+    def setUp(self):
+        super().setUp()
+        self.create_data(zones=2, campaigns=4, pois=20)
+        # POIs emmascarats
+        self.create_data(zones=1, campaigns=2, pois=10, poi_permission=False)
+        lng, lat = ORIGIN
+        for campaign in Campaign.objects.all():
+            # Dates diferents: els PCs s'ordenen per la data de la campanya
+            Campaign.objects.filter(pk=campaign.pk).update(
+                date_start=campaign.date_start + datetime.timedelta(days=campaign.pk)
+            )
+            PC.objects.create(
+                campaign=campaign, name=f'PC {campaign.pk}', format='POTREE',
+                geom=Polygon.from_bbox((lng - 0.001, lat - 0.001, lng + 0.001, lat + 0.001))
+            )
+
+    def test_entries_match_search(self):
+        lng, lat = ORIGIN
+        campaign = Campaign.objects.order_by('-pk').first()
+        entries = [
+            {'id': 'all', 'p': SEARCH_PARAMS['p'], 'r': 500},
+            {'id': 'sc', 'p': SEARCH_PARAMS['p'], 'r': 500, 'filters': {'sc': campaign.pk}},
+            {'id': 'near', 'p': [lat, lng + 2e-5], 'r': 1, 'filters': {'f': 'poi'}},
+            {'p': SEARCH_PARAMS['p'], 'r': 500, 'filters': {'c': campaign.pk, 'f': 'pc'}},
+        ]
+        response = search_batch(self.factory.post('/', entries, format='json'))
+        response.render()
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+
+        self.assertEqual(list(data), ['all', 'sc', 'near', '3'])
+        for key, entry in zip(data, entries):
+            p = entry['p'] if isinstance(entry['p'], str) else ','.join(map(str, entry['p']))
+            search_response = self.get(search, {'p': p, 'r': entry['r'], **entry.get('filters', {})})
+            search_response.render()
+            self.assertEqual(data[key], json.loads(search_response.content), key)
+        self.assertIn(-1, [feature['id'] for feature in data['all']['poi']['features']])
+        self.assertEqual(data['sc']['poi']['features'][0]['properties']['campaign'], campaign.pk)
+
+
+class VersionSignalsTest(MstreetsDataMixin, TestCase):
+
+    def test_unversioned_models_are_fast_deleted(self):
+        self.assertTrue(Collector(using=connection.alias).can_fast_delete(Poi_Hotspot.objects.all()))
+
+    def test_versions_are_bumped_once_on_commit(self):
+        self.create_data(zones=1, campaigns=2, pois=10)
+        # Sense escriure els índexs de POIs
+        for name in ('schedule_index_update', 'invalidate_campaign_index'):
+            patcher = mock.patch(f'mstreets.signals.{name}')
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        with mock.patch('mstreets.cache.bump_version') as bump_version:
+            with self.captureOnCommitCallbacks(execute=True):
+                Campaign.objects.all().delete()
+                bump_version.assert_not_called()
+        bump_version.assert_called_once()
+        self.assertTrue({'campaign', 'poi', 'poi_resource'} <= set(bump_version.call_args.args))
+
+
+class PrefetchQueryCountTest(MstreetsDataMixin, TestCase):
+
+    def serialize_pois(self):
+        pois = get_pois({}, Zone.objects.all(), Point(*ORIGIN, srid=4326), 500)
+        return PoiSerializer(pois, many=True).data
+
+    def test_get_pois_query_count_does_not_grow_with_data(self):
+        self.create_data(zones=1, campaigns=1, pois=1)
+        with CaptureQueriesContext(connection) as queries:
+            self.serialize_pois()
+
+        zones = self.create_zones(10)
+        self.create_pois(200, self.create_campaigns(20, zones), resources=3)
+        with self.assertNumQueries(len(queries)):
+            data = self.serialize_pois()
+        self.assertEqual(len(data['features']), 201)
+        self.assertEqual(len(data['features'][-1]['properties']['resources']), 3)
+
+    def test_poi_list_query_count_does_not_grow_with_data(self):
+        poi = self.create_data(zones=1, campaigns=1, pois=1)[0]
+        count = self.count_queries(poi_list, {'id': poi.pk})
+
+        self.create_zones(20)
+        poi = self.create_pois(1, Campaign.objects.all(), resources=50)[0]
+        with self.assertNumQueries(count):
+            response = self.get(poi_list, {'id': poi.pk})
+        self.assertEqual(len(response.data['properties']['resources']), 50)
+
+    def create_campaigns_with_relations(self, count, zones):
+        campaigns = self.create_campaigns(count, zones)
+        for index, campaign in enumerate(campaigns):
+            campaign.metadata = Metadata.objects.create(sensor=f'Sensor {index}')
+            campaign.category = Campaign_Category.objects.create(name=f'Categoria {index}')
+            campaign.save()
+            campaign.zones.set(zones)
+        return campaigns
+
+    def test_campaign_list_query_count_does_not_grow_with_data(self):
+        self.create_campaigns_with_relations(1, self.create_zones(1))
+        count = self.count_queries(campaign_list)
+
+        self.create_campaigns_with_relations(30, self.create_zones(5))
+        self.get(campaign_list)
+        with self.assertNumQueries(count):
+            response = self.get(campaign_list)
+        self.assertEqual(len(response.data), 31)
+
+
+class DBGeoJSONTest(MstreetsDataMixin, TestCase):
+    """The FeatureCollection built in PostGIS must be the one of the DRF serializer."""
+
+    def setUp(self):
+        super().setUp()
+        pois = self.create_data(zones=2, campaigns=4, pois=20)
+        self.create_data(zones=1, campaigns=2, pois=10, poi_permission=False)
+        # Dates amb i sense microsegons
+        for poi in pois[::2]:
+            Poi.objects.filter(pk=poi.pk).update(date=poi.date.replace(microsecond=0))
+
+    def get_pois(self, epsg=None, params=None):
+        pois = get_pois(params or {}, Zone.objects.all(), Point(*ORIGIN, srid=4326), 500)
+        return transform_geom_epsg(pois, epsg)
+
+    def assertSameFeatureCollection(self, queryset, Serializer):
+        context = get_serializer_context(queryset)
+        expected = json.loads(json.dumps(Serializer(queryset, many=True, context=context).data, cls=JSONEncoder))
+        data = json.loads(get_feature_collection(queryset, Serializer, **context))
+
+        self.assertEqual(list(data), list(expected))
+        self.assertEqual([feature['id'] for feature in data['features']], [f['id'] for f in expected['features']])
+        for feature, expected_feature in zip(data['features'], expected['features']):
+            geometry, expected_geometry = feature.pop('geometry'), expected_feature.pop('geometry')
+            self.assertEqual(list(geometry), list(expected_geometry))
+            for coordinate, expected_coordinate in zip(geometry['coordinates'], expected_geometry['coordinates']):
+                self.assertAlmostEqual(coordinate, expected_coordinate, places=7)
+            self.assertEqual(feature, expected_feature)
+
+    def test_pois(self):
+        self.assertSameFeatureCollection(self.get_pois(), PoiSerializer)
+
+    def test_pois_reprojected(self):
+        self.assertSameFeatureCollection(self.get_pois(epsg=25831), PoiSerializer)
+
+    def test_no_permitted_zones(self):
+        pois = get_pois({}, Zone.objects.filter(pk__in=[]), Point(*ORIGIN, srid=4326), 500)
+        self.assertSameFeatureCollection(pois, PoiSerializer)
+        self.assertEqual(json.loads(get_feature_collection(pois, PoiSerializer))['features'], [])
+
+    def test_pois_order(self):
+        campaign = Campaign.objects.order_by('-pk').first()
+        self.assertSameFeatureCollection(self.get_pois(params={'sc': str(campaign.pk)}), PoiSerializer)
+
+
+def flatten_coordinates(coordinates):
+    if isinstance(coordinates, (int, float)):
+        return [coordinates]
+    return [value for item in coordinates for value in flatten_coordinates(item)]
+
+
+class BinaryFormatTest(MstreetsDataMixin, TestCase):
+    """The MessagePack and FlatGeobuf responses must have the data of the JSON response."""
+
+    def setUp(self):
+        super().setUp()
+        self.pois = self.create_data(zones=2, campaigns=2, pois=10)
+        lng, lat = ORIGIN
+        self.campaign = Campaign.objects.order_by('pk').first()
+        for index in range(5):
+            PC.objects.create(
+                campaign=self.campaign, name=f'PC {index}', format='POTREE', is_downloadable=bool(index % 2),
+                config={'points': index} if index else None,
+                geom=Polygon.from_bbox((lng, lat, lng + 0.001 * (index + 1), lat + 0.001))
+            )
+
+    def render(self, view, params):
+        response = self.get(view, params)
+        response.render()
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def get_json(self, view, params):
+        return json.loads(self.render(view, params).content)
+
+    def assertSameMessagePack(self, view, params):
+        response = self.render(view, {**params, 'format': 'msgpack'})
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), self.get_json(view, params))
+
+    def assertSameFlatGeobuf(self, content, expected):
+        with MemoryFile(content) as memory_file, memory_file.open() as layer:
+            features = list(layer)
+
+        self.assertEqual([feature.properties['id'] for feature in features], [f['id'] for f in expected])
+        for feature, expected_feature in zip(features, expected):
+            properties = dict(feature.properties)
+            properties.pop('id')
+            for name, expected_value in expected_feature['properties'].items():
+                value = properties.pop(name)
+                if isinstance(expected_value, (dict, list)):
+                    value = json.loads(value)
+                self.assertEqual(value, expected_value, name)
+            self.assertEqual(properties, {})
+
+            self.assertEqual(feature.geometry.type, expected_feature['geometry']['type'])
+            coordinates = flatten_coordinates(feature.geometry.coordinates)
+            expected_coordinates = flatten_coordinates(expected_feature['geometry']['coordinates'])
+            self.assertEqual(len(coordinates), len(expected_coordinates))
+            for coordinate, expected_coordinate in zip(coordinates, expected_coordinates):
+                self.assertAlmostEqual(coordinate, expected_coordinate, places=7)
+
+    def test_msgpack_poi(self):
+        self.assertSameMessagePack(poi_list, {'id': self.pois[0].pk})
+
+    def test_msgpack_search(self):
+        self.assertSameMessagePack(search, SEARCH_PARAMS)
+
+    def test_flatgeobuf_search(self):
+        for f in ('poi', 'pc'):
+            response = self.render(search, {**SEARCH_PARAMS, 'f': f, 'format': 'fgb'})
+            self.assertEqual(response['Content-Type'], 'application/flatgeobuf')
+            expected = self.get_json(search, {**SEARCH_PARAMS, 'f': f})[f]['features']
+            self.assertTrue(expected)
+            self.assertSameFlatGeobuf(response.content, expected)
+
+    def test_flatgeobuf_paginated(self):
+        params = {'c': self.campaign.pk, 'limit': 2}
+        response = self.render(pc_list, {**params, 'format': 'fgb'})
+        self.assertEqual(response['Content-Type'], 'application/flatgeobuf')
+        self.assertIn('rel="next"', response['Link'])
+        expected = self.get_json(pc_list, params)['results']['features']
+        self.assertEqual(len(expected), 2)
+        self.assertSameFlatGeobuf(response.content, expected)
+
+
+class PointsRouteTest(MstreetsDataMixin, TestCase):
+    """POIs along a north-south line through ORIGIN, some of them east of the line."""
+
+    def setUp(self):
+        super().setUp()
+        index_root = tempfile.TemporaryDirectory()
+        self.addCleanup(index_root.cleanup)
+        patcher = mock.patch('mstreets.poi_index.POI_INDEX_ROOT', index_root.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.campaigns = self.create_campaigns(2, self.create_zones(1))
+        lng, lat = ORIGIN
+        self.line = LineString((lng, lat - 0.001), (lng, lat + 0.001), srid=4326)
+
+    def create_poi(self, north, east, campaign=None):
+        """Create a POI north and east metres from ORIGIN."""
+        lng, lat = ORIGIN
+        self.created += 1
+        return Poi.objects.create(
+            campaign=campaign or self.campaigns[0], filename=f'{self.created}.jpg', format='JPG', type='PANO',
+            date=timezone.now(), altitude=10., roll=0., pitch=0., pan=0., folder='pano',
+            geom=Point(
+                lng + east / (METRES_PER_DEGREE * math.cos(math.radians(lat))), lat + north / METRES_PER_DEGREE,
+                srid=4326
+            )
+        )
+
+    def get_ids(self, engine):
+        return [poi['id'] for poi in engine(self.line, Zone.objects.all())]
+
+    def test_index_engine_matches_kdtree(self):
+        on_line = self.create_poi(-50, 0)
+        # A 25 m a l'est: dins del corredor de 30 m, que amb la longitud sense escalar era de ~22 m
+        east = self.create_poi(50, 25)
+        self.create_poi(80, 35)
+
+        self.assertEqual(self.get_ids(get_pois_lat_lng_along_line), [on_line.pk, east.pk])
+        self.assertEqual(self.get_ids(get_pois_lat_lng_along_line_from_index), [on_line.pk, east.pk])
+
+    def test_index_skips_deleted_pois(self):
+        first = self.create_poi(-50, 0)
+        deleted = self.create_poi(0, 0)
+        last = self.create_poi(50, 0)
+        self.assertEqual(self.get_ids(get_pois_lat_lng_along_line_from_index), [first.pk, deleted.pk, last.pk])
+
+        # L'índex s'actualitza en confirmar la transacció, que als tests no arriba
+        deleted.delete()
+        self.assertEqual(self.get_ids(get_pois_lat_lng_along_line_from_index), [first.pk, last.pk])
+
+    def post_batch(self, data):
+        response = points_route_batch(self.factory.post('/', data, format='json'))
+        self.assertEqual(response.status_code, 200)
+        return [[poi['id'] for poi in pois] for pois in json.loads(response.content)['poisLatLng']]
+
+    def test_batch(self):
+        on_line = self.create_poi(-50, 0)
+        east = self.create_poi(50, 25)
+        self.create_poi(80, 35)
+        lng, lat = ORIGIN
+        # Segona línia més al sud, sense POIs
+        lines = {'type': 'MultiLineString', 'coordinates': [
+            [list(point) for point in self.line.coords], [[lng, lat - 0.01], [lng, lat - 0.009]]
+        ]}
+        self.assertEqual(self.post_batch({'lines': lines}), [[on_line.pk, east.pk], []])
+
+        point = {'type': 'Point', 'coordinates': list(ORIGIN)}
+        response = points_route_batch(self.factory.post('/', {'lines': point}, format='json'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_preferred_campaign(self):
+        on_line = self.create_poi(0, 0)
+        # De la campanya preferent, a 25 m a l'est
+        preferred = self.create_poi(0, 25, campaign=self.campaigns[1])
+        lines = {'type': 'LineString', 'coordinates': [list(point) for point in self.line.coords]}
+
+        self.assertEqual(self.post_batch({'lines': lines}), [[on_line.pk]])
+        # Només prop del centre de la línia la campanya preferent és a menys de 30 m
+        self.assertEqual(
+            self.post_batch({'lines': lines, 'sc': self.campaigns[1].pk}), [[on_line.pk, preferred.pk, on_line.pk]]
+        )
+
+
+class StubContextInfoHandler(BaseHTTPRequestHandler):
+    """Answer like the ICGC reverse geocoder, with the status and delay of the server."""
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        time.sleep(self.server.delay)
+        body = json.dumps({'features': [{'properties': {'via': 'C-31', 'km': 12}}]}).encode()
+        self.send_response(self.server.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+    MSTREETS_CACHE_ALIAS: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'context-info'},
+})
+class ContextInfoTest(SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubContextInfoHandler)
+        self.server.requests = []
+        self.server.status = 200
+        self.server.delay = 0
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        url = f'http://127.0.0.1:{self.server.server_port}/invers'
+
+        class StubRoadPK(ICGCRoadPK):
+            def get_url(self, lat, lng):
+                return f'{url}?lon={lng}&lat={lat}'
+
+        self.api = StubRoadPK()
+        # Les dades de LocMemCache es mantenen entre tests amb el mateix LOCATION
+        get_cache().clear()
+        self.addCleanup(get_cache().clear)
+
+    def get_values(self, response):
+        return [item['value'] for item in response['response']['data'][0]['data']]
+
+    def test_timeout(self):
+        self.server.delay = 0.5
+        with mock.patch('mstreets.tenants.core.context_info.CONTEXT_INFO_READ_TIMEOUT', 0.1):
+            with self.assertRaises(RemoteServiceUnavailable):
+                self.api.get(41.38, 2.17)
+
+    def test_cache_hit_for_near_point(self):
+        self.assertEqual(self.get_values(self.api.get(41.38001, 2.17001)), ['C-31', 12])
+        # A ~1 m del primer punt: mateixa clau de la cache
+        self.assertEqual(self.get_values(self.api.get(41.38002, 2.17002)), ['C-31', 12])
+        self.assertEqual(len(self.server.requests), 1)
+
+        self.api.get(41.39, 2.18)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_errors_are_not_cached(self):
+        self.server.status = 500
+        self.assertEqual(self.get_values(self.api.get(41.38, 2.17)), [None, None])
+        self.assertEqual(len(self.server.requests), 1)
+
+        self.server.status = 200
+        self.assertEqual(self.get_values(self.api.get(41.38, 2.17)), ['C-31', 12])
+        self.assertEqual(len(self.server.requests), 2)
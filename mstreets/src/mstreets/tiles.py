@@ -0,0 +1,161 @@
+import hashlib
+import os
+import shutil
+
+from django.contrib.gis.db.models.functions import Transform
+from django.contrib.gis.geos import Polygon
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+
+from mstreets.cache import get_versions
+from mstreets.functions import AsMVTGeom, SimplifyPreserveTopology
+
+from .settings import (
+    TILES_CACHE_ROOT, TILES_SIMPLIFY_PIXELS, TILES_THINNING_MAX_ZOOM, TILES_THINNING_PIXELS
+)
+
+
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+WEB_MERCATOR_ORIGIN = 20037508.342789244
+MAX_ZOOM = 30
+
+PERMISSION_MODELS = ('campaign', 'zone', 'zonegrouppermission')
+
+# Camps (propietats de la tessel·la) i models dels que depèn cada capa
+TILE_LAYERS = {
+    'poi': {
+        'fields': ('id', 'campaign_id', 'type', 'folder', 'filename'),
+        'models': ('poi',) + PERMISSION_MODELS,
+        'points': True,
+    },
+    'pc': {
+        'fields': ('id', 'campaign_id', 'name', 'format'),
+        'models': ('pc',) + PERMISSION_MODELS,
+        'points': False,
+    },
+    'poi_locations': {
+        'fields': ('id', 'campaign_id', 'tag', 'color'),
+        'models': ('poi_locations',) + PERMISSION_MODELS,
+        'points': False,
+    },
+    'zone': {
+        'fields': ('id', 'name'),
+        'models': ('zone', 'zonegrouppermission'),
+        'points': False,
+    },
+    'campaign': {
+        'fields': ('id', 'name', 'default'),
+        'models': PERMISSION_MODELS,
+        'points': False,
+    },
+}
+
+
+def is_valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def get_tile_bounds(z: int, x: int, y: int) -> Polygon:
+    """Return the EPSG:3857 envelope of an XYZ tile."""
+    size = 2 * WEB_MERCATOR_ORIGIN / 2 ** z
+    xmin = -WEB_MERCATOR_ORIGIN + x * size
+    ymax = WEB_MERCATOR_ORIGIN - y * size
+    bounds = Polygon.from_bbox((xmin, ymax - size, xmin + size, ymax))
+    bounds.srid = 3857
+    return bounds
+
+
+def get_pixel_size(z: int) -> float:
+    """Size in metres of a pixel of a 256px tile."""
+    return 2 * WEB_MERCATOR_ORIGIN / 2 ** z / 256
+
+
+def build_tile(queryset, layer: str, z: int, x: int, y: int) -> bytes:
+    """Build the Mapbox Vector Tile of a layer with ST_AsMVT.
+
+    Polygons and lines are simplified to TILES_SIMPLIFY_PIXELS and, below
+    TILES_THINNING_MAX_ZOOM, points are thinned to one per cell of
+    TILES_THINNING_PIXELS.
+    """
+    config = TILE_LAYERS[layer]
+    bounds = get_tile_bounds(z, x, y)
+    geom = Transform('geom', 3857)
+    if not config['points']:
+        geom = SimplifyPreserveTopology(geom, get_pixel_size(z) * TILES_SIMPLIFY_PIXELS)
+
+    inner = queryset.filter(
+        geom__bboverlaps=bounds.transform(4326, clone=True)
+    ).annotate(
+        mvt_geom=AsMVTGeom(geom, bounds, TILE_EXTENT, TILE_BUFFER)
+    ).values(*config['fields'], 'mvt_geom')
+    try:
+        inner_sql, params = inner.query.sql_with_params()
+    except EmptyResultSet:
+        # Sense zones permeses (pk__in=[])
+        return b''
+
+    distinct = ''
+    if config['points'] and z < TILES_THINNING_MAX_ZOOM:
+        cell = TILES_THINNING_PIXELS * TILE_EXTENT / 256
+        distinct = f'DISTINCT ON (floor(ST_X(i.mvt_geom) / {cell}), floor(ST_Y(i.mvt_geom) / {cell}))'
+    sql = (
+        f"SELECT ST_AsMVT(t, %s, {TILE_EXTENT}, 'mvt_geom') FROM ("
+        f'SELECT {distinct} i.* FROM ({inner_sql}) i WHERE i.mvt_geom IS NOT NULL'
+        ') t'
+    )
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, (layer, *params))
+        tile = cursor.fetchone()[0]
+    return bytes(tile or b'')
+
+
+def get_layer_stamp(layer: str) -> str:
+    """Return the hash of the versions of the models of the layer, the directory of its current tiles."""
+    versions = sorted(get_versions(TILE_LAYERS[layer]['models']).items())
+    return hashlib.sha1(repr(versions).encode()).hexdigest()
+
+
+def get_tile_path(layer: str, fingerprint: str, z: int, x: int, y: int) -> str:
+    return os.path.join(TILES_CACHE_ROOT, layer, get_layer_stamp(layer), fingerprint, str(z), str(x), f'{y}.mvt')
+
+
+def get_cached_tile(path: str):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def save_cached_tile(path: str, tile: bytes) -> None:
+    # El directori pot ser d'una versió anterior que clean_stale_tiles acaba d'esborrar
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(tile)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def clean_stale_tiles() -> int:
+    """Remove the cached tiles of previous versions of the layers and return the number of directories removed.
+
+    The tile paths include the version of the models, so stale tiles are never
+    served and this only frees disk space.
+    """
+    removed = 0
+    for layer in TILE_LAYERS:
+        layer_root = os.path.join(TILES_CACHE_ROOT, layer)
+        try:
+            stamps = os.listdir(layer_root)
+        except OSError:
+            continue
+        current = get_layer_stamp(layer)
+        for stamp in stamps:
+            if stamp != current:
+                shutil.rmtree(os.path.join(layer_root, stamp), ignore_errors=True)
+                removed += 1
+    return removed
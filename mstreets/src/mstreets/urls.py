@@ -3,13 +3,20 @@ from django.views.i18n import JavaScriptCatalog
 
 from mstreets.api import (
     animation_list,
+    campaign_export,
     campaign_list,
     config_list,
     pc_list,
+    poi_hotspots,
     poi_list,
+    poi_nearest,
     search,
+    search_batch,
+    search_cache_stats,
+    tile,
     zone_list,
     points_route,
+    points_route_batch,
     context_info_api,
 )
 from mstreets.views import (
@@ -24,6 +31,7 @@ urlpatterns = [
     path('jsi18n/', JavaScriptCatalog.as_view()),
     path('api/config', config_list),
     path('api/campaign', campaign_list),
+    path('api/campaign/<int:campaign_pk>/export', campaign_export),
     path(
         'api/campaign/<int:campaign_pk>/context-info',
         context_info_api,
@@ -31,10 +39,16 @@ urlpatterns = [
     ),
     path('api/zone', zone_list),
     path('api/poi', poi_list),
+    path('api/poi/nearest', poi_nearest),
+    path('api/poi/<int:poi_pk>/hotspots', poi_hotspots),
     path('api/pc', pc_list),
     path('api/search', search),
+    path('api/search/batch', search_batch),
+    path('api/search/cache', search_cache_stats),
     path('api/animation', animation_list),
+    path('api/tiles/<str:layer>/<int:z>/<int:x>/<int:y>.mvt', tile),
     path('api/points_route', points_route),
+    path('api/points_route/batch', points_route_batch),
     path('files/<path:path>', panoramas_files_server, name='panoramas-files'),
     path('add_default_config', add_default_config, name='mstreets-add-default-config'),
     path('upload_poi_file', UploadPOIFileView().view, name='mstreets-upload-poi-file'),